@@ -0,0 +1,115 @@
+#===============================================================================
+# This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#===============================================================================
+
+"""
+    Statistics over the items of a listing for resh, the reddit shell
+    Needs NumPy
+    @author: Luis E. Perez (edd07 at github)
+"""
+
+import time
+from itertools import islice
+
+BAR_WIDTH=40
+
+class Columns():
+    """The fields of a set of items as NumPy arrays, one per field. Text fields
+    are stored as integer codes, which are keys of domain_names and author_names.
+    Fields are read from each item's attributes, so missing ones aren't fetched"""
+    def __init__(self,np,items):
+        scores,created,comments,domains,authors=[],[],[],[],[]
+        self.domain_names,self.author_names={},{} #value -> code
+        for item in items:
+            a=vars(item)
+            score=a.get('score')
+            if score is None: #comments only have ups and downs
+                score=(a.get('ups') or 0)-(a.get('downs') or 0)
+            scores.append(score)
+            created.append(a.get('created_utc') or 0)
+            comments.append(a.get('num_comments') or 0)
+            domains.append(self.domain_names.setdefault(a.get('domain') or '',len(self.domain_names)))
+            author=a.get('author')
+            authors.append(self.author_names.setdefault(author.name if author else '[deleted]',len(self.author_names)))
+        self.score=np.array(scores,dtype=np.int64)
+        self.created=np.array(created,dtype=np.float64)
+        self.comments=np.array(comments,dtype=np.int64)
+        self.domain=np.array(domains,dtype=np.int32)
+        self.author=np.array(authors,dtype=np.int32)
+
+    def __len__(self):
+        return len(self.score)
+
+def bar(count,largest,width=BAR_WIDTH):
+    return "#"*int(round(width*count/largest)) if largest else ""
+
+def top(np,codes,names,n=5):
+    """Returns the n most frequent values of a coded column, with their counts"""
+    counts=np.bincount(codes,minlength=len(names))
+    by_code=dict((code,name) for name,code in names.items())
+    best=np.argsort(counts)[::-1][:n]
+    return [(by_code[i],int(counts[i])) for i in best if counts[i]]
+
+def report(np,c):
+    """Returns the lines of a report about the items in c"""
+    out=[]
+    q=np.percentile(c.score,[0,25,50,75,90,100])
+    out.append("{} items".format(len(c)))
+    out.append("Score     min {:.0f}  p25 {:.0f}  median {:.0f}  p75 {:.0f}  p90 {:.0f}  max {:.0f}  mean {:.1f}".format(*q,c.score.mean()))
+
+    #score histogram with logarithmic bins: <1, 1-9, 10-99...
+    edges=np.array([-np.inf,1,10,100,1000,10000,np.inf])
+    counts,_=np.histogram(c.score,bins=edges)
+    labels=["<1","1-9","10-99","100-999","1K-9K","10K+"]
+    for label,count in zip(labels,counts):
+        out.append("  {:>8} {:>6} {}".format(label,count,bar(count,counts.max())))
+
+    dated=c.created[c.created>0]
+    if len(dated)>1:
+        span=(dated.max()-dated.min())/3600
+        out.append("Posted over {:.1f} hours, {:.2f} items per hour".format(span,len(dated)/span if span else 0))
+        hours=np.bincount((dated//3600%24).astype(np.int64),minlength=24)
+        out.append("By hour (UTC)"+"".join("{:>5}".format(h) for h in range(0,24,2)))
+        out.append("             "+"".join("{:>5}".format(int(n)) for n in hours.reshape(12,2).sum(axis=1)))
+
+    if c.comments.any():
+        scored=c.score>0
+        ratios=c.comments[scored]/c.score[scored]
+        out.append("Comments per point  overall {:.3f}  median {:.3f}".format(
+                    c.comments.sum()/max(c.score.sum(),1),np.median(ratios) if len(ratios) else 0))
+
+    for title,codes,names in (("Top domains",c.domain,c.domain_names),("Top authors",c.author,c.author_names)):
+        best=[(name,n) for name,n in top(np,codes,names) if name]
+        if best:
+            out.append(title)
+            for name,n in best:
+                out.append("  {:<40} {:>6} {}".format(name[:40],n,bar(n,best[0][1],30)))
+    return out
+
+def analyze(items,n=1000):
+    """Returns a report about the first n items, or a message saying why it can't"""
+    try:
+        import numpy as np
+    except ImportError:
+        return ["Can't analyze items: NumPy is not installed"]
+    start=time.time()
+    fetched=list(islice(items,n))
+    if not fetched:
+        return ["There are no items to analyze"]
+    fetch_time=time.time()-start
+    start=time.time()
+    c=Columns(np,fetched)
+    out=report(np,c)
+    out.append("Fetched in {:.1f} s, analyzed in {:.1f} ms".format(fetch_time,(time.time()-start)*1000))
+    return out
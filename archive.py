@@ -0,0 +1,103 @@
+#===============================================================================
+# This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#===============================================================================
+
+"""
+    Offline archive of threads for resh, the reddit command-line shell
+    @author: Luis E. Perez (edd07 at github)
+"""
+
+import json
+import struct
+import zlib
+
+import reddit
+import records
+import seen
+
+LENGTH=struct.Struct("<I")
+
+def comment_tree(comments):
+    """Converts a forest of comments to nested records, leaving out
+    the 'load more comments' placeholders"""
+    out=[]
+    for comment in comments:
+        if isinstance(comment,reddit.objects.Comment):
+            record=records.to_record(comment)
+            record['replies']=comment_tree(comment.replies)
+            out.append(record)
+    return out
+
+def stub_tree(record):
+    """Converts a nested record back to a stub with stub replies"""
+    replies=record.pop('replies',[])
+    stub=records.from_record(record)
+    stub._offline=True
+    stub.replies=[stub_tree(r) for r in replies]
+    return stub
+
+class Archive():
+    """Threads appended to a data file, each one a zlib-compressed JSON blob.
+    A memory-mapped hash table maps the submission's fullname to the offset
+    and length of its latest blob, so opening a thread is a single read"""
+    def __init__(self,path=None):
+        self.path=path or records.data_path("archive.dat")
+        self.index=seen.Mmap_Table(self.path+".idx",b"reshARCH",3)
+
+    def add(self,submission):
+        """Archives a submission with its whole comment tree. Archiving it
+        again appends a new copy and points the index to it"""
+        try:
+            comments=submission.all_comments
+        except AttributeError:
+            comments=submission.comments
+        thread={'submission': records.to_record(submission),'comments': comment_tree(comments)}
+        blob=zlib.compress(json.dumps(thread,separators=(',',':')).encode('utf-8'))
+        with open(self.path,'ab') as f:
+            offset=f.tell()
+            f.write(LENGTH.pack(len(blob))+blob)
+        self.index.put(records.fullname(submission),offset,len(blob))
+
+    def _read(self,f,offset,length):
+        f.seek(offset+LENGTH.size)
+        return json.loads(zlib.decompress(f.read(length)).decode('utf-8'))
+
+    def get(self,fullname):
+        """Returns an archived submission as a stub whose comments are
+        stubs too, or None if it isn't archived"""
+        entry=self.index.get(fullname)
+        if not entry:
+            return None
+        with open(self.path,'rb') as f:
+            thread=self._read(f,*entry)
+        submission=records.from_record(thread['submission'])
+        submission._offline=True
+        submission.comments=[stub_tree(c) for c in thread['comments']]
+        return submission
+
+    def __contains__(self,fullname):
+        return fullname in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def submissions(self):
+        """Yields stubs of the archived submissions, newest first, without
+        their comments. Threads are only decompressed as they're needed"""
+        entries=sorted((values for key,values in self.index.items()),reverse=True)
+        with open(self.path,'rb') as f:
+            for offset,length in entries:
+                stub=records.from_record(self._read(f,offset,length)['submission'])
+                stub._offline=True
+                yield stub
@@ -0,0 +1,95 @@
+#===============================================================================
+# This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#===============================================================================
+
+"""
+    Detection of reposts and crossposts of the same link for resh, the reddit shell
+    @author: Luis E. Perez (edd07 at github)
+"""
+
+import re
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+#query parameters that only track where a link was shared from
+TRACKING=re.compile(r"^(utm_.*|fbclid|gclid|dclid|mc_[a-z]+|ref|ref_src|ref_url|src|share|si|feature|igshid|context)$")
+
+HOST_PREFIXES=("www.","m.","mobile.","old.","np.")
+
+#image ids are 7 characters and album ids 5. Thumbnails add a size letter to the id
+IMGUR_ID=re.compile(r"^/(?:gallery/|a/|r/[^/]+/)?([A-Za-z0-9]{7}|[A-Za-z0-9]{5})(?:[sbtmlh]?\.[a-z0-9]+)?/?$")
+YOUTUBE_PATH=re.compile(r"^/(?:embed|shorts|v|live)/([A-Za-z0-9_-]{11})")
+#links to reddit threads, which is what crossposts are
+REDDIT_THREAD=re.compile(r"^(?:/r/[^/]+)?/comments/([a-z0-9]+)")
+
+def normalize_url(url):
+    """Returns a form of url shared by every way of writing the same link, so
+    that http://www.imgur.com/abcde and https://i.imgur.com/abcde.jpg or
+    youtu.be/ID and youtube.com/watch?v=ID&feature=share are equal. The
+    result is only meant to be compared, it may not be a working URL. It's
+    None for malformed URLs, which are never collapsed"""
+    if not url:
+        return None
+    if url.startswith('/'):
+        url="https://reddit.com"+url #permalinks are relative in some listings
+    try:
+        parts=urlsplit(url.strip())
+        host=(parts.hostname or '').lower()
+    except ValueError: #e.g. an unclosed '[' in the host
+        return None
+    for prefix in HOST_PREFIXES:
+        if host.startswith(prefix):
+            host=host[len(prefix):]
+            break
+    path=parts.path
+    query=[(k,v) for k,v in parse_qsl(parts.query) if not TRACKING.match(k.lower())]
+
+    if host in ('imgur.com','i.imgur.com'):
+        m=IMGUR_ID.match(path)
+        if m:
+            return "imgur.com/"+m.group(1)
+    elif host in ('youtube.com','youtu.be','youtube-nocookie.com'):
+        video=path[1:12] if host=='youtu.be' else dict(query).get('v')
+        m=YOUTUBE_PATH.match(path)
+        if m:
+            video=m.group(1)
+        if video:
+            return "youtube.com/"+video
+    elif host=='reddit.com' or host.endswith('.reddit.com') or host=='redd.it':
+        if host=='redd.it':
+            return "reddit.com/comments/"+path.strip('/').lower()
+        m=REDDIT_THREAD.match(path.lower())
+        if m:
+            return "reddit.com/comments/"+m.group(1)
+
+    out=host+path.rstrip('/')
+    if query:
+        out+="?"+urlencode(sorted(query))
+    return out
+
+class Url_Index():
+    """Normalized URLs of the submissions fetched in this session. It's shared
+    by every listing, so each URL is only normalized once"""
+    def __init__(self):
+        self.keys={} #fullname -> normalized url of the submission
+
+    def key(self,item):
+        """Returns the normalized url of a submission, or None for other items"""
+        if item.__class__.__name__!='Submission':
+            return None
+        name=item.content_id
+        try:
+            return self.keys[name]
+        except KeyError:
+            key=self.keys[name]=normalize_url(vars(item).get('url'))
+            return key
@@ -0,0 +1,122 @@
+#===============================================================================
+# This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#===============================================================================
+
+"""
+    Functions for exporting whole listings to disk in resh, the reddit shell
+    @author: Luis E. Perez (edd07 at github)
+"""
+
+import csv
+import json
+import os
+import sys
+import time
+from itertools import islice
+
+import records
+
+BATCH_SIZE=100 #items written between checkpoints
+
+def checkpoint_path(path):
+    return path+".checkpoint"
+
+class Other_Listing(ValueError):
+    """The interrupted export to a file was of another listing"""
+
+def listing_key(listing):
+    """What identifies a listing in a checkpoint: where its items come from,
+    or its title for listings of local items"""
+    return list(listing.origin) if listing.origin else ['title',listing.title]
+
+def read_checkpoint(path):
+    """Returns (after, count, size, listing) for an interrupted export to path,
+    or (None, 0, None, None). size is how long the file was at the checkpoint,
+    and listing the listing_key of what was being exported"""
+    try:
+        with open(checkpoint_path(path)) as f:
+            checkpoint=json.load(f)
+        return checkpoint['after'], checkpoint['count'], checkpoint.get('size'), checkpoint.get('listing')
+    except (OSError, ValueError, KeyError):
+        return None, 0, None, None
+
+def write_checkpoint(path,after,count,size,listing):
+    """Atomically records the fullname of the last item written to path"""
+    tmp=checkpoint_path(path)+".tmp"
+    with open(tmp,'w') as f:
+        json.dump({'after': after, 'count': count, 'size': size, 'listing': listing},f)
+    os.replace(tmp,checkpoint_path(path))
+
+class JSONL_Writer():
+    def __init__(self,f,resuming):
+        self.f=f
+    def write(self,record):
+        self.f.write(json.dumps(record,ensure_ascii=False)+"\n")
+
+class CSV_Writer():
+    def __init__(self,f,resuming):
+        self.f=f
+        self.resuming=resuming
+        self.writer=None
+    def write(self,record):
+        if not self.writer:
+            #columns are taken from the first record, so it's best used on
+            #listings that have a single kind of item
+            fields=['kind','id','fullname','author','subreddit']+list(records.FIELDS.get(record['kind'],()))
+            self.writer=csv.DictWriter(self.f,fields,extrasaction='ignore')
+            if not self.resuming:
+                self.writer.writeheader()
+        self.writer.writerow(record)
+
+def export(listing,path,max_items=None,out=sys.stdout):
+    """Writes every item of a listing to path as JSON lines, or as CSV if path
+    ends with '.csv'. Items are written in batches, after each of which a
+    checkpoint is saved, so an interrupted export resumes where it stopped.
+    Returns the number of items in the file. Raises listings.Cursor_Lost if
+    the last item written isn't in the listing anymore, and Other_Listing if
+    the checkpoint is of another listing, keeping the checkpoint"""
+    key=listing_key(listing)
+    after,count,size,exported=read_checkpoint(path)
+    resuming=after is not None
+    if resuming and exported is not None and exported!=key:
+        raise Other_Listing(path)
+    if resuming and size is not None and os.path.exists(path) and os.path.getsize(path)>size:
+        #drop what was written of the batch that was interrupted
+        os.truncate(path,size)
+    items=listing.restart(after)
+    if max_items is not None:
+        items=islice(items,max(max_items-count,0))
+
+    Writer=CSV_Writer if path.lower().endswith('.csv') else JSONL_Writer
+    start=time.time()
+    written=0
+    with open(path,'a' if resuming else 'w',newline='',encoding='utf-8') as f:
+        writer=Writer(f,resuming)
+        while True:
+            batch=list(islice(items,BATCH_SIZE))
+            if not batch:
+                break
+            for item in batch:
+                writer.write(records.to_record(item))
+            f.flush()
+            written+=len(batch)
+            count+=len(batch)
+            write_checkpoint(path,records.fullname(batch[-1]),count,f.tell(),key)
+            rate=written/max(time.time()-start,0.001)
+            out.write("\r{:>8} items {:>8.1f} items/s".format(count,rate))
+            out.flush()
+    out.write("\n")
+    if os.path.exists(checkpoint_path(path)):
+        os.remove(checkpoint_path(path))
+    return count
@@ -0,0 +1,113 @@
+#===============================================================================
+# This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#===============================================================================
+
+"""
+    Client-side filters over listings for resh, the reddit command-line shell
+    @author: Luis E. Perez (edd07 at github)
+"""
+
+import operator
+import re
+import time
+
+#How to get each field that can be filtered on from an item
+FIELDS={
+        'score':     lambda i: i.score,
+        'comments':  lambda i: i.num_comments,
+        'age':       lambda i: time.time()-i.created_utc,
+        'domain':    lambda i: i.domain,
+        'author':    lambda i: i.author.name if i.author else "[deleted]",
+        'subreddit': lambda i: i.subreddit.display_name,
+        'title':     lambda i: i.title,
+        }
+NUMERIC=('score','comments','age')
+
+#Longest operators first, so '>=' isn't read as '>'
+OPERATORS=[
+           ('>=', operator.ge),
+           ('<=', operator.le),
+           ('!=', operator.ne),
+           ('!~', lambda value, regex: not regex.search(value)),
+           ('>',  operator.gt),
+           ('<',  operator.lt),
+           ('=',  operator.eq),
+           ('~',  lambda value, regex: bool(regex.search(value))),
+           ]
+
+AGE_UNITS={'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800, 'y': 31536000}
+
+EXPRESSION=re.compile(r"^(?P<field>[a-z]+)(?P<op>"+"|".join(re.escape(op) for op,f in OPERATORS)+r")(?P<value>.+)$")
+
+def parse_age(value):
+    """Converts an age like '90m', '2d' or '1w' to seconds"""
+    if value[-1] in AGE_UNITS:
+        return float(value[:-1])*AGE_UNITS[value[-1]]
+    return float(value)
+
+def predicate(term):
+    """Compiles a term like 'score>500' or 'domain!~imgur' into a function
+    that tells whether an item passes it"""
+    m=EXPRESSION.match(term)
+    if not m or m.group('field') not in FIELDS:
+        raise ValueError("Invalid filter: "+term)
+    field,op,value=m.group('field','op','value')
+    get=FIELDS[field]
+    compare=dict(OPERATORS)[op]
+
+    if op in ('~','!~'):
+        try:
+            value=re.compile(value,re.IGNORECASE)
+        except re.error as e:
+            raise ValueError("Invalid filter: "+term+" ("+str(e)+")")
+    elif field=='age':
+        value=parse_age(value)
+    elif field in NUMERIC:
+        value=float(value)
+    else:
+        value=value.lower()
+        get=lambda i, get=get: get(i).lower()
+
+    def passes(item):
+        try:
+            return compare(get(item),value)
+        except (AttributeError, TypeError):
+            #the item doesn't have this field, e.g. the title of a comment
+            return False
+    return passes
+
+class Filter():
+    """A set of terms that items must all pass. Terms are space-separated,
+    and 'scan=N' sets how many items can be looked at before giving up"""
+    def __init__(self,expression,max_scanned=1000):
+        self.expression=expression
+        self.max_scanned=max_scanned
+        self.predicates=[]
+        for term in expression.split():
+            if term.startswith('scan='):
+                self.max_scanned=int(term[len('scan='):])
+            else:
+                self.predicates.append(predicate(term))
+        self.scanned=0
+        self.stopped=False #True if max_scanned was reached
+
+    def apply(self,items):
+        """Lazily yields the items that pass every term"""
+        for item in items:
+            if self.scanned>=self.max_scanned:
+                self.stopped=True
+                return
+            self.scanned+=1
+            if all(p(item) for p in self.predicates):
+                yield item
@@ -0,0 +1,99 @@
+#===============================================================================
+# This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#===============================================================================
+
+"""
+    Local full-text index of everything seen in resh, the reddit shell
+    @author: Luis E. Perez (edd07 at github)
+"""
+
+import json
+import sqlite3
+
+import records
+
+SCHEMA="""
+CREATE TABLE IF NOT EXISTS items(
+    rowid INTEGER PRIMARY KEY,
+    fullname TEXT UNIQUE,
+    title TEXT,
+    body TEXT,
+    record TEXT
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+    title, body, content='items', content_rowid='rowid'
+);
+CREATE TRIGGER IF NOT EXISTS items_ai AFTER INSERT ON items BEGIN
+    INSERT INTO items_fts(rowid, title, body) VALUES (new.rowid, new.title, new.body);
+END;
+CREATE TRIGGER IF NOT EXISTS items_ad AFTER DELETE ON items BEGIN
+    INSERT INTO items_fts(items_fts, rowid, title, body) VALUES ('delete', old.rowid, old.title, old.body);
+END;
+CREATE TRIGGER IF NOT EXISTS items_au AFTER UPDATE ON items BEGIN
+    INSERT INTO items_fts(items_fts, rowid, title, body) VALUES ('delete', old.rowid, old.title, old.body);
+    INSERT INTO items_fts(rowid, title, body) VALUES (new.rowid, new.title, new.body);
+END;
+"""
+
+#Which record fields hold the searchable title and body of each kind of item
+TEXT_FIELDS={
+             'Submission': ('title','selftext'),
+             'Comment':    ('link_title','body'),
+             'Message':    ('subject','body'),
+             'Subreddit':  ('display_name','title'),
+             }
+
+class Local_Index():
+    """SQLite FTS5 index of titles, self text and comment bodies"""
+    def __init__(self,path=None):
+        self.db=sqlite3.connect(path or records.data_path("index.db"))
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def add(self,items):
+        """Adds or updates a page of items in a single transaction"""
+        rows=[]
+        for item in items:
+            record=records.to_record(item)
+            fields=TEXT_FIELDS.get(record['kind'])
+            if fields and record['fullname']:
+                title,body=(record.get(f) or '' for f in fields)
+                rows.append((record['fullname'],title,body,json.dumps(record)))
+        if rows:
+            with self.db:
+                self.db.executemany("""INSERT INTO items(fullname,title,body,record) VALUES (?,?,?,?)
+                                       ON CONFLICT(fullname) DO UPDATE SET
+                                       title=excluded.title, body=excluded.body, record=excluded.record""",
+                                    rows)
+
+    def search(self,terms,limit=500):
+        """Returns a generator of stubs for the items matching every word
+        in terms, best matches first"""
+        #quote every word so that the user's text is never parsed as FTS syntax
+        query=" ".join('"'+word.replace('"','""')+'"' for word in terms.split())
+        if not query:
+            return iter(())
+        rows=self.db.execute("""SELECT items.record FROM items_fts JOIN items ON items.rowid=items_fts.rowid
+                                  WHERE items_fts MATCH ? ORDER BY items_fts.rank LIMIT ?""",
+                               (query,limit)).fetchall()
+        return (records.from_record(json.loads(row[0])) for row in rows)
+
+def open_index():
+    """Returns the local index, or None if this python's sqlite has no FTS5"""
+    try:
+        return Local_Index()
+    except sqlite3.Error as e:
+        print("The local index isn't available:",e)
+        return None
@@ -0,0 +1,183 @@
+#===============================================================================
+# This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#===============================================================================
+
+"""
+    Persistent HTTP connections to reddit for resh, the reddit shell
+    @author: Luis E. Perez (edd07 at github)
+"""
+
+import http.client
+import threading
+import time
+from urllib.error import URLError
+from urllib.parse import urlsplit
+from urllib.request import BaseHandler, getproxies, proxy_bypass
+
+IDLE_PING=45 #seconds a connection can be idle before it's pinged
+IDEMPOTENT=('GET','HEAD','OPTIONS') #methods that can be sent again after a failure
+
+class Request_Sent(URLError):
+    """The request was sent, but no response came back, so the server may
+    have acted on it"""
+
+class Keep_Alive_Handler(BaseHandler):
+    """urllib handler that reuses one connection per host instead of opening
+    a new one for every request. It's added to the reddit client's opener,
+    so every request it makes goes through the same connections.
+
+    Connections aren't thread-safe, so every use outside of a command holds
+    lock, which resh holds while running a command.
+
+    Requests through a proxy are left to urllib's own handlers, which know
+    how to tunnel through it"""
+    handler_order=100 #before urllib's own HTTPHandler and HTTPSHandler
+
+    def __init__(self,lock,user_agent):
+        self.lock=lock
+        self.user_agent=user_agent
+        self.connections={} #(scheme, host) -> connection
+        self.last_used={}   #(scheme, host) -> time of the last request
+        self.responses={}   #(scheme, host) -> last response on the connection
+        self.connects=0
+        self.connect_time=0.0
+        self.requests=0
+
+    def http_open(self,req):
+        return self._open('http',req)
+
+    def https_open(self,req):
+        return self._open('https',req)
+
+    def _connect(self,scheme,host,timeout=None):
+        cls=http.client.HTTPSConnection if scheme=='https' else http.client.HTTPConnection
+        start=time.perf_counter()
+        conn=cls(host,timeout=timeout)
+        conn.connect()
+        self.connect_time+=time.perf_counter()-start
+        self.connects+=1
+        self.connections[(scheme,host)]=conn
+        return conn
+
+    def _open(self,scheme,req):
+        if req.has_proxy() or req._tunnel_host:
+            return None
+        key=(scheme,req.host)
+        headers=dict(req.unredirected_hdrs)
+        headers.update(req.headers)
+        headers['Connection']='keep-alive'
+        for attempt in range(2):
+            conn=self._idle(key)
+            reused=conn is not None
+            sent=False
+            try:
+                if not reused:
+                    conn=self._connect(scheme,req.host,req.timeout)
+                conn.request(req.get_method(),req.selector,req.data,headers)
+                sent=True
+                response=conn.getresponse()
+                break
+            except (http.client.HTTPException, OSError) as e:
+                #the server may have closed an idle connection, so retry once on a
+                #new one. Unless it's safe to send twice, only if it wasn't sent,
+                #since reddit may have acted on it, e.g. posted a reply
+                self.close(key)
+                if not reused or attempt==1 or (sent and req.get_method() not in IDEMPOTENT):
+                    raise (Request_Sent if sent else URLError)(e)
+        self.requests+=1
+        self.last_used[key]=time.time()
+        self._track(key,response)
+        if response.will_close:
+            self.connections.pop(key,None)
+        #what urllib's own handlers add to a response
+        response.url=req.get_full_url()
+        response.msg=response.reason
+        return response
+
+    def _idle(self,key):
+        """Returns the connection to a host if it can take another request.
+        One whose last response wasn't read to the end, like the body of an
+        HTTPError, is closed instead, since what's left of it would be read
+        as the next response"""
+        conn=self.connections.get(key)
+        response=self.responses.get(key)
+        if conn and response and not response.complete:
+            self.close(key)
+            return None
+        return conn
+
+    def _track(self,key,response):
+        """Keeps response as the last one on a connection, noting when it's
+        read to the end. http.client closes it then, while it's still open"""
+        response.complete=response.isclosed() #e.g. with no body
+        close_conn=response._close_conn
+        def closing():
+            if not response.closed:
+                response.complete=True
+            close_conn()
+        response._close_conn=closing
+        self.responses[key]=response
+
+    def close(self,key):
+        self.responses.pop(key,None)
+        conn=self.connections.pop(key,None)
+        if conn:
+            conn.close()
+
+    def warm(self,urls):
+        """Opens connections to the hosts in urls in a background thread, so
+        the first command doesn't wait for the TCP and TLS handshakes. Then
+        keeps pinging them while they're idle, so they stay open"""
+        def run():
+            with self.lock:
+                for url in urls:
+                    parts=urlsplit(url)
+                    if parts.scheme in getproxies() and not proxy_bypass(parts.hostname):
+                        continue #requests to it won't use this connection
+                    if (parts.scheme,parts.netloc) not in self.connections:
+                        try:
+                            self._connect(parts.scheme,parts.netloc)
+                        except OSError:
+                            pass #the first request will try again
+            while True:
+                time.sleep(IDLE_PING/3)
+                if self.lock.acquire(blocking=False):
+                    try:
+                        self.ping()
+                    finally:
+                        self.lock.release()
+        threading.Thread(target=run,name="keep-alive",daemon=True).start()
+
+    def ping(self):
+        """Sends a HEAD request on every connection idle for IDLE_PING seconds"""
+        for key in list(self.connections):
+            conn=self._idle(key)
+            if conn and time.time()-self.last_used.get(key,0)>IDLE_PING:
+                try:
+                    conn.request('HEAD','/robots.txt',headers={'Connection': 'keep-alive','User-Agent': self.user_agent})
+                    response=conn.getresponse()
+                    response.read()
+                    self.last_used[key]=time.time()
+                    self._track(key,response)
+                    if response.will_close:
+                        self.close(key)
+                except (http.client.HTTPException, OSError):
+                    self.close(key)
+
+    def stats(self):
+        """Returns a description of how much connection time was saved"""
+        average=self.connect_time/self.connects if self.connects else 0
+        reused=max(self.requests-self.connects,0)
+        return ("{} requests over {} connections. Opening a connection took {:.0f} ms on average,"+\
+                " so reusing them saved about {:.0f} ms").format(self.requests,self.connects,average*1000,reused*average*1000)
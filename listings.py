@@ -19,37 +19,93 @@
 """
 
 import reddit
+import records
+import render
 import sys
+from itertools import chain, tee
 from datetime import datetime, timedelta
 
+#comments that can be shown in a comment tree, including archived ones
+COMMENTS=(reddit.objects.Comment,records.STUBS['Comment'])
+
+class Cursor_Lost(LookupError):
+    """The item a listing was to continue after isn't in it anymore, e.g.
+    a deleted message"""
+
+def skip_past(items,after):
+    """Yields the items after the one with the fullname 'after'. Raises
+    Cursor_Lost if there's no such item"""
+    items=iter(items)
+    for item in items:
+        if records.fullname(item)==after:
+            yield from items
+            return
+    raise Cursor_Lost(after)
+
 class Listing():
     
     #Fix formatting for the sucky windows console
     if sys.platform == 'win32':
         BOLD=""
+        DIM=""
         RESET=""
         ORANGERED=""
         SEPARATOR="--------------------------------------------------------------------------------"
         NEWLINE=""
     else:
         BOLD="\033[1m"
+        DIM="\033[2m"
         RESET="\033[0m"
         ORANGERED="\033[31m"
         SEPARATOR="\n--------------------------------------------------------------------------------\n"
         NEWLINE="\n"
     
-    def __init__(self, title, prompt, generator):
+    #functions that are called with every page of new items fetched by any listing
+    observers=[]
+    #store of the items seen in earlier sessions, and whether to skip them or dim them
+    seen=None
+    hide_seen=False
+    #seen items that can be skipped while filling a page before giving up, and
+    #whether the page on screen was cut short because of it
+    max_hidden=200
+    hidden_stopped=False
+    #whether seen items are hidden or dimmed in this listing. Only listings
+    #browsed from reddit do it; local ones are made of items already seen
+    filters_seen=True
+    #index of normalized submission URLs shared by every listing. Submissions
+    #linking to one that's already in the listing are collapsed into it
+    duplicates=None
+    #formats the Markdown in bodies, shared so its cache is too
+    renderer=render.Renderer()
+    #what the listing's items come from, as plain values, so it can be recreated
+    #in another session. e.g. ('subreddit', 'python', 'hot')
+    origin=None
+    #the reddit client, to fetch listings without a source again from their origin
+    session=None
+    
+    def __init__(self, title, prompt, generator, source=None):
         self.title=title
         self.prompt=prompt
         self.generator=generator
+        #source(url_data) returns a new generator over the listing. Passing
+        #{'after': fullname} makes it start after that item
+        self.source=source
         self.prev=[] #pages that come before the current one
         self.next=[] #pages that come after the current one
         self.content=""
         self.items=None
+        self.keep_pages=True #keep visited pages so that 'prev' can show them
+        self.seen_before=set() #fullnames of items that were seen before they were fetched
+        self.collapsed={} #normalized url -> fullname of the item that's shown for it
+        self.reposts={}   #fullname -> number of other submissions collapsed into it
+        self._setup_formatting()
+        self.next_Page()
+    
+    def _setup_formatting(self):
+        """Per-instance formatting, also needed by listings restored without __init__"""
         #bypass asciify for non-windows systems
         if(sys.platform!='win32'): self._asciify=lambda x,strip_newlines=True: x
         self.str_str=lambda x: x
-        self.next_Page()
     
     def _time(self,timestamp):
         delta = (datetime.utcnow()-datetime.fromtimestamp(timestamp))
@@ -90,33 +146,92 @@ class Listing():
                 s=s[width:]
         return Listing.NEWLINE.join(out)
     
+    def _render(self,item,body,width,margin,style=""):
+        """Like _wrap, but formats the Markdown in the body of an item"""
+        return Listing.renderer.render(self._asciify(body,strip_newlines=False),width,margin,style,records.fullname(item))
+    
     def go(self,num):
         return self.items[num-1]
+    
+    def restart(self,after=None):
+        """Returns an iterator over every item in the listing, starting after 
+        the item with the fullname 'after' if it's given. Listings without a
+        source are fetched again from their origin. Those of local items, which
+        have neither, go through the pages already seen and then a copy of
+        their own generator, which keeps what's read from it for the next pages"""
+        if self.source:
+            return self.source({'after': after} if after else {})
+        if self.origin and Listing.session:
+            import snapshot #it imports this module
+            return snapshot.resume(Listing.session,self.origin,after)
+        
+        pages=self.prev+[self.items or []]+self.next[::-1]
+        self.generator,rest=tee(self.generator)
+        items=chain(chain.from_iterable(pages),rest)
+        if after:
+            items=skip_past(items,after)
+        return items
 
         
     def next_Page(self,items_per_page=10):
         """Retrieves the next page of items either from reddit, or the local copies
         if they've already been visited"""
-        if self.items:
+        if self.items and self.keep_pages:
             self.prev.append(self.items)  
+        self.hidden_stopped=False
         if self.next:
             #local copies
             self.items=self.next.pop()
         else:
             #retrieve new stories
             self.items=[]
+            hidden=0
             try:
-                for i in range(items_per_page):
-                    self.items.append(next(self.generator))
-            except StopIteration:
+                while len(self.items)<items_per_page:
+                    item=next(self.generator)
+                    name=records.fullname(item)
+                    if self.is_repost(item,name):
+                        continue
+                    if self.filters_seen and Listing.seen is not None and name and name in Listing.seen:
+                        if Listing.hide_seen:
+                            hidden+=1
+                            if hidden>=Listing.max_hidden:
+                                self.hidden_stopped=True
+                                break
+                            continue
+                        self.seen_before.add(name)
+                    self.items.append(item)
+            except (StopIteration, Cursor_Lost):
                 pass
+            for observer in Listing.observers:
+                observer(self.items)
         
     
+    def is_repost(self,item,name):
+        """Tells if item links to the same URL as an item already in the listing,
+        and counts it as one of its reposts if it does"""
+        if Listing.duplicates is None:
+            return False
+        key=Listing.duplicates.key(item)
+        if not key:
+            return False
+        first=self.collapsed.setdefault(key,name)
+        if first==name:
+            return False
+        self.reposts[first]=self.reposts.get(first,0)+1
+        return True
+    
+    def _reposts(self,submission):
+        """Returns a '+N ' marker for a submission with N reposts collapsed into it"""
+        n=self.reposts.get(records.fullname(submission))
+        return "+"+str(n)+" " if n else ""
+    
     def prev_Page(self):
         """Retrieves previous pages of items from local copies"""
         if self.prev[-1]:
             self.next.append(self.items)
             self.items=self.prev.pop()
+            self.hidden_stopped=False
         else:
             raise IndexError
     
@@ -134,23 +249,29 @@ class Listing():
         counter=1
         for i in self.items:
             try:
-                out.append("{}{:>2}{} ".format(Listing.BOLD,counter,Listing.RESET)+\
-                           getattr(self,"str_"+i.__class__.__name__)(i))
+                item="{}{:>2}{} ".format(Listing.BOLD,counter,Listing.RESET)+\
+                           getattr(self,"str_"+i.__class__.__name__)(i)
             except AttributeError:
-                out.append("{}{:>2}{} ".format(Listing.BOLD,counter,Listing.RESET)+\
-                           "Can't handle a(n) "+i.__class__.__name__)
+                item="{}{:>2}{} ".format(Listing.BOLD,counter,Listing.RESET)+\
+                           "Can't handle a(n) "+i.__class__.__name__
+            if records.fullname(i) in self.seen_before:
+                item=Listing.DIM+item.replace(Listing.RESET,Listing.RESET+Listing.DIM)+Listing.RESET
+            out.append(item)
             counter=counter+1
 
         if self.items:
             out.append("{:<80}".format("To enter an item, type 'go <number>'. For more items, type 'next'"))
         else:
             out.append("{:<80}".format("There doesn't seem to be anything here. To see the previous page, type 'prev'"))
+        if self.hidden_stopped:
+            out[-1]+=Listing.NEWLINE+"{:<80}".format("Stopped after skipping "+str(Listing.max_hidden)+
+                                                     " seen items. To keep looking, type 'next'")
 
         return Listing.SEPARATOR.join(out)
     
     def str_Submission(self,submission):
         
-        title=self._asciify(submission.title+" ("+submission.domain+")") 
+        title=self._asciify(self._reposts(submission)+submission.title+" ("+submission.domain+")") 
 
         out=["{}{:>4} {:<46}{} {:>25}".format(
                                                     Listing.BOLD,
@@ -170,7 +291,7 @@ class Listing():
                                     comment.ups-comment.downs,
                                           )]
 
-        out.append(self._wrap(comment.body,77,"   " ))
+        out.append(self._render(comment,comment.body,77,"   " ))
         return Listing.NEWLINE.join(out)
         
 class My_Subreddits_Listing(Listing):
@@ -181,6 +302,7 @@ class My_Subreddits_Listing(Listing):
                          "subreddits>",
                          generator
                          )
+        self.origin=('my_subreddits',)
     def format_count(self,count):
         """Abbreviates a number to 4 characters"""
         if count>9999999:
@@ -213,6 +335,7 @@ class Saved_Listing(Listing):
                          "saved>",
                          generator
                          )
+        self.origin=('saved',)
         
 class Search_Listing(Listing):
     """Listing of posts matching a search term"""
@@ -223,6 +346,20 @@ class Search_Listing(Listing):
                          "search results>",
                          generator
                          )
+        self.origin=('search',terms,None)
+        
+class Local_Search_Listing(Search_Listing):
+    """Listing of items in the local index matching a search term"""
+    filters_seen=False
+    
+    def __init__(self,terms,generator):
+        super().__init__(
+                         terms,
+                         generator
+                         )
+        self.title="Local search results for: "+terms
+        self.prompt="local search results>"
+        self.origin=None
         
 class Subreddit_Search_Listing(Search_Listing):
     """Listing of posts matching a search term inside a subreddit"""
@@ -233,21 +370,24 @@ class Subreddit_Search_Listing(Search_Listing):
                          generator
                         )
         self.title="Subreddit search results for: '"+terms+"' in /r/"+sub.display_name
+        self.origin=('search',terms,sub.display_name)
         
 class Subreddit_Listing(Listing):
     """Listing of a subreddit's front page"""
     def __init__(self, sub, sort='hot'):
         self.reddit_object=sub
-        generator = getattr(sub, 'get_'+sort)(limit=None)
+        self.origin=('subreddit',sub.display_name,sort)
+        source = lambda url_data: getattr(sub, 'get_'+sort)(limit=None, url_data=url_data)
         super().__init__(
                          "{}{:<46}{} {:>25}".format(Listing.BOLD,self._shorten(self._asciify(sub.title),46),Listing.RESET,"/r/"+sub.display_name),
                          "/r/"+sub.display_name+">",
-                         generator
+                         source({}),
+                         source
                                             )
         
     def str_Submission(self,submission):
         
-        title=self._asciify(submission.title+" ("+submission.domain+")") 
+        title=self._asciify(self._reposts(submission)+submission.title+" ("+submission.domain+")") 
 
         out=["{}{:>4} {:<46}{} {:>25}".format(
                                                     Listing.BOLD,
@@ -260,20 +400,68 @@ class Subreddit_Listing(Listing):
             out.append(Listing.BOLD+self._wrap(title[46:],46,"        " )+Listing.RESET)
         return Listing.NEWLINE.join(out)
         
+class Archive_Listing(Listing):
+    """Listing of the threads saved in the offline archive"""
+    filters_seen=False
+    
+    def __init__(self,generator):
+        super().__init__(
+                         "Archived threads",
+                         "archive>",
+                         generator
+                         )
+        
+class Filtered_Listing(Listing):
+    """Listing of the items in another listing that pass a filter"""
+    def __init__(self,listing,filter):
+        self.parent=listing
+        self.filter=filter
+        self.filters_seen=listing.filters_seen
+        if hasattr(listing,'reddit_object'):
+            self.reddit_object=listing.reddit_object
+        #items are formatted the same way the unfiltered listing does it, but
+        #with this listing's reposts
+        for name in dir(listing):
+            if name.startswith('str_'):
+                method=getattr(type(listing),name,None)
+                setattr(self,name,method.__get__(self) if method else getattr(listing,name))
+        super().__init__(
+                         "Filtered by '"+filter.expression+"'",
+                         listing.prompt[:-1]+" (filtered)>",
+                         filter.apply(listing.restart())
+                         )
+    
+    def __getattr__(self,name):
+        #helpers of the unfiltered listing's str_ methods, like format_count
+        if name=='parent':
+            raise AttributeError(name)
+        return getattr(self.parent,name)
+
+    def __str__(self):
+        out=super().__str__()
+        if self.filter.stopped:
+            out+=Listing.NEWLINE+"{:<80}".format("Stopped after scanning "+str(self.filter.scanned)+
+                                                 " items. To scan more, add 'scan=<number>'")
+        return out
+        
 class Frontpage_Listing(Listing):
     """Listing for the reddit.com front page"""
-    def __init__(self,generator):
-        super().__init__("Front Page","frontpage>",generator)
+    def __init__(self,generator,source=None):
+        super().__init__("Front Page","frontpage>",generator,source)
+        self.origin=('frontpage',)
         
 
 class User_Listing(Listing):
     """Listing for an user's overview"""
     def __init__(self,user):
         self.reddit_object=user
+        self.origin=('user',user.name)
+        source=lambda url_data: user.get_overview(limit=None, url_data=url_data)
         super().__init__(
                          "Overview for "+user.name,
                          "user>",
-                         user.get_overview(limit=None)
+                         source({}),
+                         source
                          )
         self.content="{}User {:<74}{}{}Link karma:{:<14} Comment karma:{:<14} Reditor for {:>12}".format(
                                 Listing.BOLD,
@@ -293,13 +481,14 @@ class Inbox_Listing(Listing):
                          "inbox>",
                          generator
                          )
+        self.origin=('inbox','inbox' if filter=='all' else filter)
     def str_Message(self,message):
         out=["{:<36} by {:<20} {:>12} ago".format(
                                         self._shorten(self._asciify(message.subject), 36),
                                         message.author.name if message.author else "[deleted]",
                                         self._time(message.created_utc)
                                                        )]
-        out.append(Listing.BOLD+self._wrap(self._asciify(message.body,strip_newlines=False), 80, "")+Listing.RESET)
+        out.append(Listing.BOLD+self._render(message,message.body,80,"",Listing.BOLD)+Listing.RESET)
         return Listing.NEWLINE.join(out)
     
     def str_Comment(self,comment):
@@ -309,11 +498,14 @@ class Inbox_Listing(Listing):
                                    self._time(comment.created_utc)
                                           )]
 
-        out.append(Listing.BOLD+self._wrap(comment.body,80,"" )+Listing.RESET)
+        out.append(Listing.BOLD+self._render(comment,comment.body,80,"",Listing.BOLD)+Listing.RESET)
         return Listing.NEWLINE.join(out)
 
 class Submission_Listing(Listing):
     """Listing for a submission's comment page"""    
+    sort=None #reddit's default order
+    filters_seen=False
+    
     def __init__(self,submission):
         self.reddit_object=submission
         super().__init__(
@@ -321,12 +513,24 @@ class Submission_Listing(Listing):
                          "submission>",
                          (i for i in submission.comments)
                         )
+        self.origin=('submission',submission.permalink)
         if(submission.is_self):
-            body= self._wrap(self._asciify(submission.selftext,strip_newlines=False),80,"")
+            body= self._render(submission,submission.selftext,80,"")
         else:
             body= "Link: {:<74}".format(submission.url)
         
         self.content=Listing.BOLD+self._wrap(self._asciify(submission.title),80,"")+Listing.RESET+Listing.SEPARATOR+body
+    
+    def sort_by(self,sort,comments):
+        """Starts over from the first page, with the comments in another order"""
+        self.sort=sort
+        self.title="Top-level Comments, sorted by "+sort
+        self.origin=('submission',self.reddit_object.permalink,sort)
+        self.generator=iter(comments)
+        self.prev=[]
+        self.next=[]
+        self.items=None
+        self.next_Page()
         
     def str_Comment(self,comment):
         out=["{}by {:<43} {:>4} points  {:>13} ago{}".format(
@@ -337,11 +541,13 @@ class Submission_Listing(Listing):
                                     Listing.RESET
                                           )]
 
-        out.append(self._wrap(self._asciify(comment.body,strip_newlines=False),77,"   " ))
+        out.append(self._render(comment,comment.body,77,"   " ))
         return Listing.NEWLINE.join(out)
     
 class Comment_Listing(Listing):
     """Listing for a comment's replies"""
+    filters_seen=False
+    
     def __init__(self,comment):
         super().__init__(
                          "Replies for {:<}",
@@ -351,7 +557,7 @@ class Comment_Listing(Listing):
         self.reddit_object=comment
         self._flat_comments=[]
         self._counter=1
-        self.content=self._wrap(self._asciify(comment.body,strip_newlines=False),77,"" )
+        self.content=self._render(comment,comment.body,77,"" )
         
     def __str__(self):
         try:
@@ -374,7 +580,7 @@ class Comment_Listing(Listing):
                                     len(self.prev)+1
                                                  ))
         for i in self.items:
-            if isinstance(i,reddit.objects.Comment):
+            if isinstance(i,COMMENTS):
                 out.append(self.__str_Reply(i,"| "))
             
         if self.items:
@@ -408,14 +614,14 @@ class Comment_Listing(Listing):
                                     self._time(reply.created_utc),
                                     Listing.RESET
                                           )+Listing.NEWLINE+\
-                                          self._wrap(reply.body, 80, margin)
+                                          self._render(reply,reply.body, 80, margin)
         out=[body]
         
         self._counter+=1
         self._flat_comments.append(reply)
         
         for i in reply.replies:
-            if isinstance(i,reddit.objects.Comment):
+            if isinstance(i,COMMENTS):
                 out.append(self.__str_Reply(i,margin+" | "))
         
         return Listing.SEPARATOR.join(out)
\ No newline at end of file
@@ -0,0 +1,92 @@
+#===============================================================================
+# This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#===============================================================================
+
+"""
+    Cache of subreddit and redditor metadata for resh, the reddit shell
+    @author: Luis E. Perez (edd07 at github)
+"""
+
+import time
+from urllib.parse import urljoin
+
+import reddit
+
+BATCH_SIZE=100 #most fullnames reddit's info endpoint takes at once
+
+class Metadata_Cache():
+    """Keeps Subreddit and Redditor objects by name for ttl seconds, so their
+    lazy attributes are only fetched once. Subreddits whose fullnames have
+    been seen in listings are fetched together, up to 100 per request"""
+    def __init__(self,session,ttl=3600):
+        self.session=session
+        self.ttl=ttl
+        self.subreddits={} #lowercase name -> (expiry time, Subreddit)
+        self.redditors={}  #lowercase name -> (expiry time, Redditor)
+        self.fullnames={}  #lowercase name -> 't5_' fullname of subreddits seen in listings
+
+    def _get(self,cache,name):
+        entry=cache.get(name.lower())
+        if entry and entry[0]>time.time():
+            return entry[1]
+        return None
+
+    def _put(self,cache,name,obj):
+        cache[name.lower()]=(time.time()+self.ttl,obj)
+
+    def learn(self,items):
+        """Listing observer: keeps the subreddits in a page, and remembers the
+        fullnames of the subreddits its items were posted to"""
+        for item in items:
+            attributes=vars(item)
+            if isinstance(item,reddit.objects.Subreddit) and 'title' in attributes:
+                self._put(self.subreddits,item.display_name,item)
+            elif attributes.get('subreddit_id') and attributes.get('subreddit'):
+                self.fullnames[item.subreddit.display_name.lower()]=item.subreddit_id
+
+    def fill(self,first):
+        """Fetches the subreddit named first along with up to 99 other
+        subreddits that were seen but aren't cached, in a single request.
+        Those reddit doesn't return, e.g. because they're banned or private,
+        are forgotten, so they aren't asked for again"""
+        missing=[first.lower()]+[name for name in self.fullnames
+                                 if name!=first.lower() and not self._get(self.subreddits,name)]
+        batch=missing[:BATCH_SIZE]
+        ids=",".join(self.fullnames[name] for name in batch)
+        url=urljoin(self.session.config['reddit_url'],'api/info/')
+        for sub in self.session.get_content(url,url_data={'id': ids},limit=None):
+            if isinstance(sub,reddit.objects.Subreddit):
+                self._put(self.subreddits,sub.display_name,sub)
+        for name in batch:
+            if not self._get(self.subreddits,name):
+                del self.fullnames[name]
+
+    def subreddit(self,name):
+        if name.lower()=='random':
+            return self.session.get_subreddit(name)
+        sub=self._get(self.subreddits,name)
+        if not sub and name.lower() in self.fullnames:
+            self.fill(name)
+            sub=self._get(self.subreddits,name)
+        if not sub:
+            sub=self.session.get_subreddit(name)
+            self._put(self.subreddits,name,sub)
+        return sub
+
+    def redditor(self,name):
+        user=self._get(self.redditors,name)
+        if not user:
+            user=self.session.get_redditor(name)
+            self._put(self.redditors,name,user)
+        return user
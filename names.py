@@ -0,0 +1,109 @@
+#===============================================================================
+# This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#===============================================================================
+
+"""
+    Index of subreddit and user names for tab completion in resh, the reddit shell
+    @author: Luis E. Perez (edd07 at github)
+"""
+
+import json
+import os
+import threading
+from bisect import bisect_left, insort
+
+import reddit
+import records
+
+class Sorted_Names():
+    """Names kept sorted by their lowercase form, so every name with a
+    given prefix is found with a binary search"""
+    def __init__(self,names=()):
+        self.keys=[]   #lowercase names, sorted
+        self.names={}  #lowercase name -> name as reddit writes it
+        for name in names:
+            self.add(name)
+
+    def add(self,name):
+        key=name.lower()
+        if key not in self.names:
+            insort(self.keys,key)
+        self.names[key]=name
+
+    def starting_with(self,prefix,limit=100):
+        prefix=prefix.lower()
+        out=[]
+        i=bisect_left(self.keys,prefix)
+        while i<len(self.keys) and self.keys[i].startswith(prefix) and len(out)<limit:
+            out.append(self.names[self.keys[i]])
+            i+=1
+        return out
+
+    def __iter__(self):
+        return (self.names[key] for key in self.keys)
+
+class Name_Index():
+    """The subreddit and user names seen in listings, saved between sessions.
+    Subreddit prefixes with no local match are looked up on reddit in the
+    background, so they can be completed the next time Tab is pressed"""
+    def __init__(self,session,lock,path=None):
+        self.session=session
+        self.lock=lock
+        self.path=path or records.data_path("names.json")
+        self.searched=set() #prefixes already looked up on reddit
+        saved={}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path) as f:
+                    saved=json.load(f)
+            except (OSError, ValueError):
+                pass
+        self.subreddits=Sorted_Names(saved.get('subreddits',()))
+        self.users=Sorted_Names(saved.get('users',()))
+
+    def learn(self,items):
+        """Listing observer: adds the subreddits and authors of a page"""
+        for item in items:
+            attributes=vars(item)
+            if attributes.get('subreddit'):
+                self.subreddits.add(item.subreddit.display_name)
+            if attributes.get('author'):
+                self.users.add(item.author.name)
+            if isinstance(item,(reddit.objects.Subreddit,records.STUBS['Subreddit'])):
+                self.subreddits.add(item.display_name)
+
+    def complete_subreddit(self,prefix):
+        matches=self.subreddits.starting_with(prefix)
+        if not matches and len(prefix)>=2 and prefix.lower() not in self.searched:
+            self.searched.add(prefix.lower())
+            threading.Thread(target=self._search,args=(prefix,),daemon=True).start()
+        return matches
+
+    def complete_user(self,prefix):
+        return self.users.starting_with(prefix)
+
+    def _search(self,prefix):
+        try:
+            with self.lock:
+                found=self.session.search_reddit_names(prefix)
+            for sub in found:
+                self.subreddits.add(sub.display_name)
+        except Exception:
+            pass #completion is best effort, the user can still type the name
+
+    def save(self):
+        tmp=self.path+".tmp"
+        with open(tmp,'w') as f:
+            json.dump({'subreddits': list(self.subreddits),'users': list(self.users)},f)
+        os.replace(tmp,self.path)
@@ -0,0 +1,229 @@
+#===============================================================================
+# This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#===============================================================================
+
+"""
+    Outbox of replies, messages and submissions for resh, the reddit shell
+    @author: Luis E. Perez (edd07 at github)
+"""
+
+import http.client
+import json
+import os
+import threading
+import time
+from urllib.error import URLError, HTTPError
+
+import reddit
+import records
+import keepalive
+
+FIRST_RETRY=5   #seconds before the first retry of a failed delivery
+LAST_RETRY=900  #the delay doubles on every attempt, up to this many seconds
+MAYBE_SENT="Reddit didn't answer properly, so it may have been sent. Check before retrying it ({})"
+
+class Outbox():
+    """Replies, messages and submissions waiting to be sent. Each one is saved
+    to disk as soon as it's written, and sent by a background thread in the
+    order they were written. Deliveries that fail because of the connection
+    are retried later; those reddit refuses are kept as failed, so the text
+    isn't lost.
+
+    Items are only sent while the user who wrote them is logged in, in the
+    order that user wrote them. Requests hold lock, like every other request
+    made outside of a command.
+
+    Deliveries are only retried on their own when they never reached reddit.
+    One that was sent but got no answer, or a server error for an answer,
+    may have been posted, so it's kept as failed, for the user to check
+    before retrying it"""
+    def __init__(self,session,lock,path=None):
+        self.session=session
+        self.lock=lock
+        self.path=path or records.data_path("outbox.json")
+        self.items=[]
+        self.targets={} #item id -> object being replied to, if it's in memory
+        self.notices=[] #what happened to items since the last command
+        self.changed=threading.Condition()
+        if os.path.exists(self.path):
+            try:
+                with open(self.path) as f:
+                    self.items=json.load(f)
+            except ValueError:
+                #keep the file, its text can still be copied by hand
+                os.replace(self.path,self.path+".corrupt")
+        threading.Thread(target=self.run,name="outbox",daemon=True).start()
+
+    def _save(self):
+        tmp=self.path+".tmp"
+        with open(tmp,'w') as f:
+            json.dump(self.items,f)
+        os.replace(tmp,self.path)
+
+    def _add(self,action,description,args,target=None):
+        user=self.session.user
+        item={
+              'id': max([i['id'] for i in self.items]+[0])+1,
+              'action': action,
+              'description': description,
+              'user': user.name if user else None,
+              'args': args,
+              'status': 'pending',
+              'attempts': 0,
+              'next_try': 0,
+              'error': None,
+              }
+        with self.changed:
+            if target is not None:
+                self.targets[item['id']]=target
+            self.items.append(item)
+            self._save()
+            self.changed.notify()
+        return item
+
+    def reply(self,target,text):
+        """Queues a reply to a submission, comment or message"""
+        attributes=vars(target) #so describing it doesn't fetch anything
+        if attributes.get('subject'):
+            description="reply to the message '"+attributes['subject']+"'"
+        elif attributes.get('title'):
+            description="comment on '"+attributes['title']+"'"
+        elif attributes.get('author'):
+            description="reply to "+target.author.name+"'s comment"
+        else:
+            description="reply to "+records.fullname(target)
+        return self._add('reply',description,{'target': records.to_record(target),'text': text},target)
+
+    def message(self,recipient,subject,text):
+        """Queues a private message to a user or, with a '/r/' prefix, a subreddit"""
+        return self._add('message',"message to "+recipient+": "+subject,
+                         {'recipient': recipient,'subject': subject,'text': text})
+
+    def submit(self,subreddit,title,text=None,url=None):
+        """Queues a link or, if text is given, a self post"""
+        return self._add('submit',"post to /r/"+subreddit+": "+title,
+                         {'subreddit': subreddit,'title': title,'text': text,'url': url})
+
+    def pending(self):
+        return [i for i in self.items if i['status']=='pending']
+
+    def sendable(self,items):
+        """The items that the logged in user wrote, which are the ones that can be sent"""
+        user=self.session.user
+        return [i for i in items if user and i['user']==user.name]
+
+    def failed(self):
+        return [i for i in self.items if i['status']=='failed']
+
+    def retry(self):
+        """Queues the failed items again"""
+        with self.changed:
+            for item in self.failed():
+                item.update(status='pending',attempts=0,next_try=0,error=None)
+            self._save()
+            self.changed.notify()
+
+    def discard_failed(self):
+        with self.changed:
+            self.items=self.pending()
+            self._save()
+
+    def take_notices(self):
+        with self.changed:
+            notices,self.notices=self.notices,[]
+        return notices
+
+    def drain(self,timeout):
+        """Waits up to timeout seconds for the pending items that can be sent
+        to be sent"""
+        end=time.time()+timeout
+        with self.changed:
+            while self.sendable(self.pending()) and time.time()<end:
+                self.changed.wait(min(end-time.time(),1))
+
+    def _deliverable(self):
+        """Returns the first pending item if it can be sent now, and otherwise
+        how many seconds to wait before checking again"""
+        pending=self.pending()
+        if not pending:
+            return None,None
+        mine=self.sendable(pending)
+        if not mine:
+            return None,5 #until someone who wrote them logs in
+        item=mine[0] #the user's later items wait for it, so they're sent in order
+        wait=item['next_try']-time.time()
+        return (item,None) if wait<=0 else (None,wait)
+
+    def run(self):
+        while True:
+            with self.changed:
+                item,wait=self._deliverable()
+                if not item:
+                    self.changed.wait(wait)
+                    continue
+            try:
+                with self.lock:
+                    self._send(item)
+                status,error='sent',None
+            except HTTPError as e:
+                if e.code>=500: #reddit often posts it and then fails to answer
+                    status,error='failed',MAYBE_SENT.format(e)
+                else:
+                    status,error=('pending' if e.code==429 else 'failed'),str(e)
+            except keepalive.Request_Sent as e:
+                status,error='failed',MAYBE_SENT.format(e.reason)
+            except URLError as e:
+                #it couldn't be sent, e.g. no connection, so it's safe to send again
+                status,error='pending',str(e)
+            except (http.client.HTTPException, OSError) as e:
+                #raised while waiting for the response to a request that was sent
+                status,error='failed',MAYBE_SENT.format(e)
+            except reddit.errors.RateLimitExceeded as e:
+                status,error='pending',str(e)
+                item['next_try']=time.time()+getattr(e,'sleep_time',LAST_RETRY)
+            except reddit.errors.BadCaptcha:
+                status,error='failed',"A captcha is required. Captchas are not yet supported by resh"
+            except Exception as e:
+                #reddit refused it, e.g. the thread was archived or deleted
+                status,error='failed',"{}: {}".format(e.__class__.__name__,e)
+            with self.changed:
+                item['error']=error
+                if status=='sent':
+                    self.items.remove(item)
+                    self.targets.pop(item['id'],None)
+                    self.notices.append("Sent the "+item['description'])
+                elif status=='failed':
+                    item['status']='failed'
+                    self.notices.append("Couldn't send the "+item['description']+". Type 'outbox' for details")
+                else:
+                    item['attempts']+=1
+                    item['next_try']=max(item['next_try'],
+                                         time.time()+min(FIRST_RETRY*2**(item['attempts']-1),LAST_RETRY))
+                self._save()
+                self.changed.notify_all()
+
+    def _send(self,item):
+        args=item['args']
+        if item['action']=='reply':
+            target=self.targets.get(item['id'])
+            if target is None:
+                target=records.rehydrate(self.session,records.from_record(args['target']))
+            target.reply(args['text'])
+        elif item['action']=='message':
+            self.session.compose_message(args['recipient'],args['subject'],args['text'])
+        elif item['action']=='submit':
+            if args['text']:
+                self.session.submit(args['subreddit'],args['title'],text=args['text'])
+            else:
+                self.session.submit(args['subreddit'],args['title'],url=args['url'])
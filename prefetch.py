@@ -0,0 +1,117 @@
+#===============================================================================
+# This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#===============================================================================
+
+"""
+    Background prefetching of comment pages for resh, the reddit shell
+    @author: Luis E. Perez (edd07 at github)
+"""
+
+import threading
+from collections import Counter, OrderedDict
+from urllib.request import HTTPCookieProcessor, build_opener
+
+import reddit
+import records
+import keepalive
+
+def adopt(comments,session):
+    """Hands a comment tree fetched by another client to session, so replies
+    and votes are sent by it. Returns the number of comments, which is what
+    prefetched pages cost. Only replies that are loaded are visited, so
+    nothing is fetched"""
+    total=0
+    stack=list(comments)
+    while stack:
+        comment=stack.pop()
+        total+=1
+        comment.reddit_session=session
+        stack.extend(vars(comment).get('_replies') or ())
+    return total
+
+def client(session,user_agent):
+    """Returns a second reddit client with its own connections, which sends
+    the cookies of session, so it sees what the logged in user sees"""
+    cookies=[h for h in session._opener.handlers if isinstance(h,HTTPCookieProcessor)]
+    other=reddit.Reddit(user_agent=user_agent)
+    other._opener=build_opener(HTTPCookieProcessor(cookies[0].cookiejar) if cookies else HTTPCookieProcessor(),
+                               keepalive.Keep_Alive_Handler(threading.RLock(),user_agent))
+    return other
+
+class Prefetcher():
+    """Loads the comments of the submissions on screen in a background thread.
+    The comments are kept in the submission objects themselves, so
+    Submission_Listing finds them already there.
+
+    Downloads go through client, a second reddit client with connections
+    of its own, so they never hold lock and commands never wait for them.
+    lock, which resh holds while running a command, is only taken to hand
+    the comments to the submission."""
+    def __init__(self,lock,client,k=3,max_comments=5000):
+        self.k=k
+        self.max_comments=max_comments
+        self.lock=lock
+        self.client=client
+        self.wanted=threading.Condition()
+        self.queue=[]
+        self.loaded=OrderedDict() #fullname -> (submission, number of comments), oldest first
+        self.habits=Counter() #how many times each position on a page was entered
+        self.total=0
+        thread=threading.Thread(target=self.run,name="prefetch",daemon=True)
+        thread.start()
+
+    def rank(self,items):
+        """Orders the submissions on a page by how often their position is
+        entered, then by score"""
+        positions=dict((id(item),n) for n,item in enumerate(items,1))
+        return sorted(items,key=lambda i: (self.habits[positions[id(i)]],getattr(i,'score',0)),reverse=True)
+
+    def page_shown(self,items,submission_class):
+        """Replaces the queue with the best K submissions of the page just shown"""
+        submissions=[i for i in items if isinstance(i,submission_class)]
+        with self.wanted:
+            self.queue=self.rank(submissions)[:self.k]
+            self.wanted.notify()
+
+    def entered(self,position):
+        self.habits[position]+=1
+
+    def run(self):
+        while True:
+            with self.wanted:
+                while not self.queue:
+                    self.wanted.wait()
+                submission=self.queue.pop(0)
+            if getattr(submission,'_comments',None) is not None:
+                continue #already loaded, by us or by the user
+            try:
+                comments=reddit.objects.Submission.get_info(self.client,submission.permalink,comments_only=True)
+            except Exception:
+                continue #the user will see the error if they go there
+            size=adopt(comments,submission.reddit_session)
+            with self.lock:
+                if submission._comments is not None:
+                    continue #the user went there while it was downloading
+                submission.comments=comments
+            self.keep(submission,size)
+
+    def keep(self,submission,size):
+        """Tracks a prefetched page and drops the oldest ones while over the cap"""
+        self.loaded[records.fullname(submission)]=(submission,size)
+        self.total+=size
+        while self.total>self.max_comments and len(self.loaded)>1:
+            name,(old,old_size)=self.loaded.popitem(last=False)
+            self.total-=old_size
+            with self.lock:
+                old._comments=None
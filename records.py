@@ -0,0 +1,101 @@
+#===============================================================================
+# This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#===============================================================================
+
+"""
+    Plain records of reddit objects for resh, the reddit command-line shell
+    @author: Luis E. Perez (edd07 at github)
+"""
+
+import json
+import os
+
+#Attributes copied into a record for each kind of reddit object
+FIELDS={
+        'Submission': ('title','domain','url','permalink','selftext','is_self',
+                       'score','num_comments','over_18','created_utc'),
+        'Comment':    ('body','link_id','link_title','parent_id','ups','downs','created_utc'),
+        'Message':    ('subject','body','dest','created_utc'),
+        'Subreddit':  ('display_name','title','url','subscribers','over18','created_utc'),
+        'Redditor':   ('name','link_karma','comment_karma','created_utc'),
+        }
+
+DATA_DIR=None #overrides ~/.resh, e.g. while replaying a trace
+
+def data_path(name):
+    """Returns the path of a file in resh's data directory, ~/.resh"""
+    directory=DATA_DIR or os.path.join(os.path.expanduser("~"),".resh")
+    os.makedirs(directory,exist_ok=True)
+    return os.path.join(directory,name)
+
+def fullname(obj):
+    """Returns the 'kind_id' name reddit uses to identify an object, or None"""
+    try:
+        return obj.content_id
+    except (AttributeError, KeyError):
+        return None
+
+def to_record(obj):
+    """Converts a reddit object to a dict of plain values"""
+    kind=obj.__class__.__name__
+    record={'kind': kind, 'id': getattr(obj,'id',None), 'fullname': fullname(obj)}
+    for field in FIELDS.get(kind,()):
+        record[field]=getattr(obj,field,None)
+    #only look at attributes that are already there, so no lazy fetch is triggered
+    attributes=vars(obj)
+    if 'author' in attributes:
+        record['author']=obj.author.name if obj.author else None
+    if attributes.get('subreddit'):
+        record['subreddit']=obj.subreddit.display_name
+    return record
+
+def to_json(obj):
+    """Converts a reddit object to a single line of JSON"""
+    return json.dumps(to_record(obj),ensure_ascii=False)
+
+class Stub():
+    """Stands in for a reddit object rebuilt from a record, so it can be
+    listed without asking reddit for it again"""
+    def __init__(self,record):
+        self.__dict__.update(record)
+        self.content_id=record.get('fullname')
+        if 'author' in record:
+            self.author=Stub({'kind': 'Redditor','name': record['author']}) if record['author'] else None
+        if record.get('subreddit'):
+            self.subreddit=Stub({'kind': 'Subreddit','display_name': record['subreddit']})
+        if record['kind']=='Comment':
+            self.submission=Stub({'kind': 'Submission','title': record.get('link_title') or ''})
+            self.replies=[]
+
+#Stubs are named after the classes they stand in for, so that listings
+#format them with the same str_ methods
+STUBS=dict((kind, type(kind,(Stub,),{})) for kind in FIELDS)
+
+def from_record(record):
+    """Converts a record back to an object that can be shown in a listing"""
+    return STUBS.get(record['kind'],Stub)(record)
+
+def rehydrate(session,obj):
+    """Returns the reddit object a stub stands in for, fetching it from reddit.
+    Other objects are returned as they are"""
+    if not isinstance(obj,Stub):
+        return obj
+    if obj.kind=='Subreddit':
+        return session.get_subreddit(obj.display_name)
+    elif obj.kind=='Redditor':
+        return session.get_redditor(obj.name)
+    elif obj.kind=='Submission' and getattr(obj,'permalink',None):
+        return session.get_submission(url=obj.permalink)
+    else:
+        return next(session.info(thing_id=obj.content_id),obj)
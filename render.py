@@ -0,0 +1,454 @@
+#===============================================================================
+# This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#===============================================================================
+
+"""
+    Rendering of reddit's Markdown as terminal text for resh, the reddit shell
+    Run this file to measure how fast it renders a large thread
+    @author: Luis E. Perez (edd07 at github)
+"""
+
+import re
+import sys
+from collections import OrderedDict
+
+#Fix formatting for the sucky windows console
+if sys.platform == 'win32':
+    STYLES={'bold': "",'italic': "",'strike': "",'link': "",'code': "",'quote': "",'spoiler': ""}
+    RESET=""
+    NEWLINE=""
+else:
+    STYLES={
+            'bold':    "\033[1m",
+            'italic':  "\033[3m",
+            'strike':  "\033[9m",
+            'link':    "\033[4m",
+            'code':    "\033[7m",
+            'quote':   "\033[2m",
+            'spoiler': "\033[7m\033[2m",
+            }
+    RESET="\033[0m"
+    NEWLINE="\n"
+ORDER=('bold','italic','strike','link','code','quote','spoiler')
+CODES={} #style names, like 'bold italic' -> escape codes
+
+def codes(style):
+    try:
+        return CODES[style]
+    except KeyError:
+        names=style.split()
+        out=CODES[style]="".join(STYLES[s] for s in ORDER if s in names)
+        return out
+
+#Every inline element, so a line is read in a single pass
+INLINE=re.compile(r"""
+     (?P<escape>\\[\\`*_{}\[\]()#+\-.!>~^|])
+    |(?P<ticks>`+)(?P<code>.+?)(?P=ticks)
+    |(?P<bracket>\[)
+    |(?P<toggle>\*\*|__|\*|_|~~|>!|!<)
+    |(?P<entity>&(?:amp|lt|gt|quot|\#39|nbsp);)
+    """,re.VERBOSE)
+LINK_STOP=re.compile(r"[)\s]") #ends the URL of a link
+LINK_TITLE=re.compile(r'\s+"[^"\n]*"\)')
+ENTITY=re.compile(r"&(?:amp|lt|gt|quot|#39|nbsp);")
+TOGGLES={'**': 'bold','__': 'bold','*': 'italic','_': 'italic','~~': 'strike','>!': 'spoiler'}
+CLOSERS={'!<': '>!'} #markers that close a different one, the rest close themselves
+ENTITIES={'&amp;': '&','&lt;': '<','&gt;': '>','&quot;': '"','&#39;': "'",'&nbsp;': ' '}
+
+FENCE=re.compile(r"^ {0,3}(```|~~~)")
+QUOTE=re.compile(r"^ {0,3}(?:&gt;|>)(?!!) ?")
+HEADING=re.compile(r"^ {0,3}(#{1,6})\s*(.*?)\s*#*\s*$")
+RULE=re.compile(r"^ {0,3}([-*_])(?:\s*\1){2,}\s*$")
+ITEM=re.compile(r"^(\s*)([*+-]|\d{1,9}[.)])\s+(.*)$")
+TABLE_SEPARATOR=re.compile(r"^\s*\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?\s*$")
+WORDS=re.compile(r"\S+|\s+")
+
+def unescape(text):
+    return ENTITY.sub(lambda m: ENTITIES[m.group()],text)
+
+def table_cells(line):
+    line=line.strip()
+    if line.startswith('|'): line=line[1:]
+    if line.endswith('|'): line=line[:-1]
+    return [cell.strip() for cell in line.split('|')]
+
+class Links():
+    """Finds links like [text](url "title") in a text. Where the next ']',
+    newline and end of a URL are is remembered, and so is what follows each
+    ']', so each '[' is checked in constant time, however many of them are
+    left unclosed"""
+    def __init__(self,text):
+        self.text=text
+        self.close=self.newline=self.stop=-1
+        self.targets={} #position of a ']' -> (end of the link, url), or None
+        self.titles={}  #end of a URL -> end of its title, or None
+
+    def find(self,char,start):
+        i=self.text.find(char,start)
+        return i if i>=0 else len(self.text)
+
+    def match(self,start):
+        """Returns (end, text, url) if a link starts at start, or None"""
+        if self.close<=start:
+            self.close=self.find(']',start+1)
+        if self.newline<=start:
+            self.newline=self.find('\n',start+1)
+        if self.close>=self.newline: #no ']', or the text of the link would span lines
+            return None
+        if self.close not in self.targets:
+            self.targets[self.close]=self.target(self.close)
+        target=self.targets[self.close]
+        return (target[0],self.text[start+1:self.close],target[1]) if target else None
+
+    def target(self,close):
+        """Reads the (url "title") after a ']'"""
+        text=self.text
+        if not text.startswith('(',close+1):
+            return None
+        if self.stop<close+2:
+            m=LINK_STOP.search(text,close+2)
+            self.stop=m.start() if m else len(text)
+        url=text[close+2:self.stop]
+        if not url or self.stop==len(text):
+            return None
+        if text[self.stop]==')':
+            return self.stop+1,url
+        if self.stop not in self.titles:
+            m=LINK_TITLE.match(text,self.stop)
+            self.titles[self.stop]=m.end() if m else None
+        end=self.titles[self.stop]
+        return (end,url) if end else None
+
+class Renderer():
+    """Turns a comment or self post body into styled, word-wrapped lines.
+    Bodies are read once, line by line, and every line's inline elements are
+    found with a single regular expression, so the time it takes grows
+    linearly with the size of the body. Links are replaced by numbered
+    footnotes, listed under the body.
+
+    Rendered bodies are cached by the fullname of their item, since the
+    same comments are formatted every time their page is shown"""
+    def __init__(self,size=5000):
+        self.size=size
+        self.cache=OrderedDict() #(fullname, width, margin, style) -> (body, rendered body)
+
+    def render(self,text,width,margin="",style="",key=None):
+        """Returns text rendered in lines of at most width columns, each padded
+        to 80 columns and starting with margin, like Listing._wrap. style is
+        applied to all of it. If key is given, the result is cached under it"""
+        if key:
+            cache_key=(key,width,margin,style)
+            cached=self.cache.get(cache_key)
+            if cached and cached[0]==text: #unless it was edited
+                self.cache.move_to_end(cache_key)
+                return cached[1]
+        out=NEWLINE.join(Body(width,margin,style).render(text))
+        if key:
+            self.cache[cache_key]=(text,out)
+            if len(self.cache)>self.size:
+                self.cache.popitem(last=False)
+        return out
+
+class Body():
+    """State of the rendering of one body"""
+    def __init__(self,width,margin,style):
+        self.width=max(min(width,80-len(margin)),1)
+        self.margin=margin
+        self.base=style #applied to everything, e.g. bold inbox messages
+        self.out=[]
+        self.links=[]
+
+    def render(self,text):
+        lines=text.split("\n")
+        paragraph=[] #lines of the paragraph being read, which are joined
+        fence=None
+        item=None #what starts the lines of the last list item, for its indented lines
+        i=0
+        while i<len(lines):
+            line=lines[i].rstrip("\r")
+            i+=1
+            if fence is not None:
+                if line.strip().startswith(fence):
+                    fence=None
+                else:
+                    self.fill([('code',unescape(line))],"  ","  ",hard=True)
+                continue
+            #quotes wrap whatever block is inside them. Levels that would take
+            #more than half the width are shown as one
+            depth=0
+            m=QUOTE.match(line)
+            while m:
+                depth+=1
+                line=line[m.end():]
+                m=QUOTE.match(line)
+            prefix="| "*min(depth,self.width//4)
+
+            if not line.strip() or (paragraph and paragraph[0][0]!=prefix):
+                self.paragraph(paragraph)
+                paragraph=[]
+                if not line.strip():
+                    continue
+            indented=line.startswith("    ") or line.startswith("\t")
+            m=FENCE.match(line)
+            if m:
+                self.paragraph(paragraph)
+                paragraph=[]
+                fence=m.group(1)
+                continue
+            if indented and not paragraph and not item:
+                self.fill([('code',unescape(line.expandtabs(4)[4:]))],prefix+"  ",prefix+"  ",hard=True,quoted=depth)
+                continue
+            if item and (not paragraph or indented) and line.startswith(" ") and not ITEM.match(line):
+                #more text of the last list item
+                self.fill(self.inline(line.strip()),item,item,quoted=depth)
+                continue
+            if not paragraph or not line.startswith(" "):
+                item=None
+            if RULE.match(line):
+                self.paragraph(paragraph)
+                paragraph=[]
+                self.emit(prefix,[('',"-"*(self.width-len(prefix)))],depth)
+                continue
+            m=HEADING.match(line)
+            if m:
+                self.paragraph(paragraph)
+                paragraph=[]
+                self.fill(self.inline(m.group(2),('bold',)),prefix,prefix,quoted=depth)
+                continue
+            m=ITEM.match(line)
+            if m:
+                self.paragraph(paragraph)
+                paragraph=[]
+                indent=" "*min(len(m.group(1).expandtabs(4))//2*2,8)
+                bullet=m.group(2) if m.group(2)[0].isdigit() else "*"
+                item=prefix+indent+" "*(len(bullet)+1)
+                self.fill(self.inline(m.group(3)),prefix+indent+bullet+" ",item,quoted=depth)
+                continue
+            if '|' in line and i<len(lines) and TABLE_SEPARATOR.match(lines[i]):
+                self.paragraph(paragraph)
+                paragraph=[]
+                rows=[table_cells(line)]
+                i+=1
+                while i<len(lines) and '|' in lines[i] and lines[i].strip():
+                    rows.append(table_cells(QUOTE.sub("",lines[i])))
+                    i+=1
+                self.table(rows,prefix,depth)
+                continue
+            paragraph.append((prefix,line,depth))
+        self.paragraph(paragraph)
+
+        if self.links:
+            self.out.append(self.line("",[('',"")]))
+            for n,url in enumerate(self.links,1):
+                self.fill([('quote',"[{}] {}".format(n,url))],"","",hard=True)
+        return self.out
+
+    def paragraph(self,lines):
+        if not lines:
+            return
+        prefix,_,depth=lines[0]
+        #lines ending in two spaces end with a line break, the rest are joined
+        text="".join(line.strip()+("\n" if line.endswith("  ") else " ") for _,line,_ in lines)
+        self.fill(self.inline(text.strip()),prefix,prefix,quoted=depth)
+
+    def inline(self,text,styles=()):
+        """Splits a line in runs of (style, text)"""
+        runs=[]
+        markers=[] #emphasis markers that are open
+        current=lambda: " ".join(list(styles)+[TOGGLES[marker] for marker in markers])
+        position=0
+        links=Links(text)
+        m=INLINE.search(text)
+        while m:
+            start,end=m.span()
+            kind=m.lastgroup
+            if kind=='bracket':
+                link=links.match(start)
+                if not link:
+                    m=INLINE.search(text,end) #just a bracket, part of the text
+                    continue
+                end=link[0]
+            if start>position:
+                runs.append((current(),text[position:start]))
+            if kind=='escape':
+                runs.append((current(),m.group()[1]))
+            elif kind=='code':
+                runs.append((current()+" code",unescape(m.group('code'))))
+            elif kind=='bracket':
+                _,link_text,url=link
+                self.links.append(url)
+                runs.append((current()+" link",link_text or url))
+                runs.append((current(),"[{}]".format(len(self.links))))
+            elif kind=='toggle':
+                marker=m.group()
+                opener=CLOSERS.get(marker,marker)
+                before=text[start-1] if start else " "
+                after=text[end] if end<len(text) else " "
+                #underscores inside words, like in snake_case, are just underscores
+                if opener in markers and not before.isspace() and not (marker[0]=='_' and after.isalnum()):
+                    markers.remove(opener)
+                elif marker==opener and opener not in markers and not after.isspace() and \
+                     not (marker[0]=='_' and before.isalnum()):
+                    markers.append(marker)
+                else:
+                    runs.append((current(),m.group()))
+            elif kind=='entity':
+                runs.append((current(),ENTITIES[m.group()]))
+            position=end
+            m=INLINE.search(text,end)
+        if position<len(text):
+            runs.append((current(),text[position:]))
+        return runs
+
+    def table(self,rows,prefix,depth):
+        columns=max(len(row) for row in rows)
+        room=self.width-len(prefix)
+        #tables with more columns than fit 3 characters wide are wrapped, so
+        #the columns that don't fit are shown under the others
+        fit=max((room+3)//6,1)
+        if columns>fit:
+            for start in range(0,columns,fit):
+                self.table([row[start:start+fit] for row in rows],prefix,depth)
+            return
+        rendered=[[self.inline(cell) for cell in row]+[[]]*(columns-len(row)) for row in rows]
+        widths=[max(sum(len(t) for _,t in cells[c]) for cells in rendered) for c in range(columns)]
+        #columns narrower than an even share of the room keep their width, the
+        #rest share what's left evenly
+        left=room-3*(columns-1)
+        for n,c in enumerate(sorted(range(columns),key=lambda c: widths[c])):
+            widths[c]=max(min(widths[c],left//(columns-n)),1)
+            left-=widths[c]
+        for r,cells in enumerate(rendered):
+            runs=[]
+            for c,cell in enumerate(cells):
+                left=widths[c]
+                for style,t in cell:
+                    t=t[:left]
+                    if t:
+                        runs.append((style+(" bold" if r==0 else ""),t))
+                        left-=len(t)
+                runs.append(('',(" "*left)+(" | " if c<columns-1 else "")))
+            self.emit(prefix,runs,depth)
+
+    def fill(self,runs,first,rest,hard=False,quoted=0):
+        """Word-wraps runs into lines. first and rest start the first and the
+        other lines. With hard, spaces are kept and lines are only split at
+        the width"""
+        self.prefix,self.rest,self.quoted=first,rest,quoted
+        self.runs,self.column=[],len(first)
+        word,length=[],0 #a word can have several styles, e.g. snake_*case*
+        for style,text in runs:
+            for piece in ([text] if hard else WORDS.findall(text)):
+                if hard or not piece.isspace():
+                    word.append((style,piece))
+                    length+=len(piece)
+                    continue
+                self.place(word,length)
+                word,length=[],0
+                if "\n" in piece:
+                    self.newline()
+                elif self.column>len(self.prefix):
+                    self.runs.append((style," "))
+                    self.column+=1
+        self.place(word,length)
+        if self.runs or self.prefix==first:
+            self.newline()
+
+    def place(self,word,length):
+        """Adds a word to the current line, or to the next one if it doesn't
+        fit. Words longer than a line are split, even if the line's prefix
+        leaves no room for them"""
+        if self.column+length>self.width and self.column>len(self.prefix) and length<=self.width-len(self.rest):
+            self.newline()
+        if self.column+length<=self.width:
+            self.runs.extend(word)
+            self.column+=length
+            return
+        for style,text in word:
+            while text and self.column+len(text)>self.width:
+                cut=max(self.width-self.column,0 if self.runs else 1)
+                self.runs.append((style,text[:cut]))
+                text=text[cut:]
+                self.newline()
+            if text:
+                self.runs.append((style,text))
+                self.column+=len(text)
+
+    def newline(self):
+        self.emit(self.prefix,self.runs,self.quoted)
+        self.prefix,self.runs,self.column=self.rest,[],len(self.rest)
+
+    def emit(self,prefix,runs,quoted=0):
+        self.out.append(self.line(prefix,runs,quoted))
+
+    def line(self,prefix,runs,quoted=0):
+        while runs and (not runs[-1][1] or runs[-1][1].isspace()):
+            runs=runs[:-1]
+        start=self.base+(STYLES['quote'] if quoted else "")
+        parts=[self.margin,start,prefix]
+        length=len(prefix)
+        current=start
+        last=''
+        for style,text in runs:
+            if style!=last:
+                last=style
+                new=start+codes(style)
+                if new!=current:
+                    parts.append(RESET+new if current else new)
+                    current=new
+            parts.append(text)
+            length+=len(text)
+        if current!=self.base:
+            parts.append(RESET+self.base)
+        parts.append(" "*(80-len(self.margin)-length))
+        return "".join(parts)
+
+def benchmark(comments=5000,repeat=3):
+    """Renders a thread with many heavily formatted comments and prints the throughput"""
+    import random
+    import time
+    random.seed(1)
+    samples=[
+             "This is **really** important, see [the docs](https://docs.python.org/3/library/re.html) and *this*.",
+             "> Quoting the parent comment with ~~wrong~~ `right` words\n\nI disagree, because:\n\n* one\n* two, with _emphasis_\n  1. nested",
+             "Col A | Col B | Col C\n---|:---:|--:\n1 | **two** | 3\nfour | five | [six](http://example.com/6)",
+             "    def code():\n        return 42\n\nAnd some text after &amp; an entity, plus a >!spoiler!< too.",
+             "word "*200,
+             ]
+    bodies=[random.choice(samples)*random.randint(1,4) for i in range(comments)]
+    size=sum(len(b) for b in bodies)
+    best=None
+    for r in range(repeat):
+        renderer=Renderer(size=comments)
+        start=time.perf_counter()
+        for n,body in enumerate(bodies):
+            renderer.render(body,77,"| "*(n%4),key="t1_"+str(n))
+        elapsed=time.perf_counter()-start
+        best=elapsed if best is None else min(best,elapsed)
+    start=time.perf_counter()
+    for n,body in enumerate(bodies):
+        renderer.render(body,77,"| "*(n%4),key="t1_"+str(n))
+    cached=time.perf_counter()-start
+    print("{} comments, {:.1f} MB of Markdown".format(comments,size/1e6))
+    print("rendered in {:.0f} ms: {:.1f} MB/s, {:.0f} comments/s".format(best*1000,size/1e6/best,comments/best))
+    print("from the cache in {:.1f} ms".format(cached*1000))
+    #quotes deeper than the room left by the margin of a deep reply
+    start=time.perf_counter()
+    for depth in range(40):
+        Renderer().render(">"*depth+" hi",77,"| "+" | "*depth)
+        Renderer().render(">"*depth+" hi",77,"   ")
+    print("deep quotes in deep replies in {:.1f} ms".format((time.perf_counter()-start)*1000))
+
+if __name__ == "__main__":
+    benchmark()
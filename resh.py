@@ -23,8 +23,28 @@ import getpass
 import sys
 import os
 import re
+import argparse
+import threading
+import time
 
 import reddit
+import records
+import export
+import index
+import filters
+import seen
+import prefetch
+import metadata
+import snapshot
+import archive
+import names
+import keepalive
+import searches
+import analyze
+import dedup
+import outbox
+import sorts
+import traffic
 
 from urllib.error import URLError
 from mimetypes import guess_type
@@ -43,13 +63,71 @@ class resh(cmd.Cmd):
     #view command to see stuff inside the terminal
     #mod-queue listing
     
-    def __init__(self):
+    def __init__(self,batch=False,tracer=None):
         super(resh,self).__init__()
         self.prompt="resh>"
-        self.reddit = reddit.Reddit(user_agent="resh (github.com/edd07/resh)")
+        self.batch=batch #write items as JSON lines instead of formatted pages
+        self.out=sys.stdout
+        if batch:
+            #messages go to stderr so that stdout only carries the JSON lines,
+            #including those printed while starting up
+            sys.stdout=sys.stderr
+        user_agent="resh (github.com/edd07/resh)"
+        self.reddit = reddit.Reddit(user_agent=user_agent)
+        #held while a command runs, so background requests wait for it to finish
+        self.network_lock=threading.RLock()
+        #every request of the client goes through the same warm connections
+        self.keep_alive=keepalive.Keep_Alive_Handler(self.network_lock,user_agent)
+        self.reddit._opener.add_handler(self.keep_alive)
+        #records or replays the traffic of the session, see traffic.py
+        self.tracer=tracer
+        if tracer:
+            tracer.install(self.reddit._opener)
+        if not (tracer and tracer.replaying):
+            self.keep_alive.warm([self.reddit.config['reddit_url'],self.reddit.config['login']])
         self.history=[]
         self.listing=None
         self.redditor=None
+        self.metadata=metadata.Metadata_Cache(self.reddit)
+        Listing.observers.append(self.metadata.learn)
+        if not batch:
+            #reposts are only collapsed on screen, batch output keeps every item
+            Listing.duplicates=dedup.Url_Index()
+        Listing.session=self.reddit
+        self.searches=searches.Search_Cache(self.reddit)
+        self.comment_sorts=sorts.Comment_Store(self.reddit)
+        self.index=index.open_index()
+        if self.index:
+            Listing.observers.append(self.index.add)
+        try:
+            self.read_state=seen.Seen_Store()
+            Listing.seen=self.read_state
+        except (OSError, ValueError) as e:
+            print("Can't keep track of seen items:",e)
+            self.read_state=None
+        try:
+            self.archive=archive.Archive(tracer and tracer.archive_path)
+        except (OSError, ValueError) as e:
+            print("The archive isn't available:",e)
+            self.archive=None
+        try:
+            self.outbox=outbox.Outbox(self.reddit,self.network_lock,tracer and tracer.outbox_path)
+            waiting=self.outbox.pending()
+            if waiting:
+                print(len(waiting),"items in the outbox will be sent once you log in")
+        except OSError as e:
+            print("The outbox isn't available:",e)
+            self.outbox=None
+        self.prefetcher=None
+        if not batch:
+            self.prefetcher=prefetch.Prefetcher(self.network_lock,prefetch.client(self.reddit,user_agent))
+            if tracer:
+                self.prefetcher.client._opener.add_handler(tracer.handler)
+        self.names=names.Name_Index(self.reddit,self.network_lock)
+        Listing.observers.append(self.names.learn)
+        self.snapshot_time=time.time()
+        if not batch:
+            self.restore_session()
         
         #undocumented shorthand commands
         self.do_EOF=self.do_exit
@@ -59,12 +137,18 @@ class resh(cmd.Cmd):
         self.do_u = self.do_user
         self.do_sub = self.do_subscribe
         self.do_unsub = self.do_unsubscribe
+        self.complete_r = self.complete_subreddit
+        self.complete_u = self.complete_user
+        self.complete_sub = self.complete_subscribe
+        self.complete_unsub = self.complete_unsubscribe
         #self.do_+ = self.do_upvote   : implemented in resh.onecmd (+ and - not allowed in names)
         #self.do_- = self.do_downvote : 
 
         
     
     def clear(self):
+        if self.batch:
+            return
         if sys.platform=='win32':
             os.system('cls')
         else:
@@ -76,7 +160,47 @@ class resh(cmd.Cmd):
         self.history.append(self.listing)
         self.listing=listing
         self.prompt=self.listing.prompt
-        print(self.listing)
+        if self.batch:
+            #pages that were already written don't need to be kept around
+            self.listing.keep_pages=False
+        self.show()
+    
+    def show(self):
+        """Prints the current listing. In batch mode its items are
+        written to the output as JSON lines instead, one per item"""
+        if not self.batch:
+            self.clear()
+            print(self.listing)
+            if self.listing:
+                self.mark_seen(i for i in self.listing.items if isinstance(i,reddit.objects.Submission))
+                if self.prefetcher:
+                    self.prefetcher.page_shown(self.listing.items,reddit.objects.Submission)
+        elif self.listing:
+            for item in self.listing.items:
+                self.out.write(records.to_json(item)+"\n")
+                self.out.flush()
+    
+    def mark_seen(self,items):
+        """Records items as seen, so they're dimmed or hidden in later listings"""
+        if self.read_state is not None:
+            for item in items:
+                name=records.fullname(item)
+                if name:
+                    self.read_state.add(name)
+    
+    def run_batch(self,lines):
+        """Runs each command in lines without prompting. Commands in a line
+        can be separated by ';'. Messages are printed to stderr so that stdout
+        only carries the JSON lines"""
+        try:
+            for line in lines:
+                for command in line.split(';'):
+                    command=command.strip()
+                    if command and self.onecmd(command):
+                        return
+        finally:
+            self.flush_outbox()
+            sys.stdout=self.out
         
     def back(self):
         if self.history:
@@ -96,19 +220,31 @@ class resh(cmd.Cmd):
             flag= line!=''
         return "\n\n".join(out)
     
+    def get_item(self,line):
+        """Returns the numbered item in the current listing, or the listing's
+        own object if line is empty. Items that were restored from disk
+        are fetched from reddit first"""
+        if not line:
+            obj=self.listing.reddit_object
+        else:
+            obj=self.listing.go(int(line))
+        return records.rehydrate(self.reddit,obj)
+    
     def find_subreddit(self,name=''):
         """Returns a subreddit either by its name or to where the
         current item was posted."""
         if not name:
-            if isinstance(self.listing.reddit_object,reddit.objects.Subreddit):
-                return self.listing.reddit_object
+            #listings restored from disk have stubs, which are fetched first
+            obj=records.rehydrate(self.reddit,getattr(self.listing,'reddit_object',None))
+            if isinstance(obj,reddit.objects.Subreddit):
+                return obj
             else:
                 try:
-                    return self.listing.reddit_object.subreddit
+                    return self.metadata.subreddit(obj.subreddit.display_name)
                 except AttributeError:
                     return None
         else:
-            return self.reddit.get_subreddit(name)
+            return self.metadata.subreddit(name)
         
             
     def do_back(self,line):
@@ -121,8 +257,7 @@ class resh(cmd.Cmd):
             for i in range(pages):
                 self.back()
             if self.listing: 
-                self.clear()
-                print(self.listing)
+                self.show()
         except (ValueError, IndexError):
             print("Invalid argument ",line)
             
@@ -131,8 +266,7 @@ class resh(cmd.Cmd):
     Displays the next items in the current listing"""
 
         self.listing.next_Page()
-        self.clear()
-        print(self.listing)
+        self.show()
             
             
     def do_prev(self,line):
@@ -140,51 +274,183 @@ class resh(cmd.Cmd):
     Displays the previous items in the current listing"""
         try:
             self.listing.prev_Page()
-            self.clear()
-            print(self.listing)
+            self.show()
         except IndexError:
             print("These are the first posts in this listing")
         
     def do_exit(self,line):
         """Exits resh"""
+        self.save_session()
         return True
+    
+    def save_session(self):
+        """Saves the browsing history and current listing, to be restored
+        the next time resh starts"""
+        if self.batch:
+            return
+        try:
+            snapshot.save(records.data_path("session.gz"),self.history,self.listing)
+            self.names.save()
+        except (OSError, TypeError, ValueError) as e:
+            print("Can't save the session:",e)
+        self.snapshot_time=time.time()
+    
+    def restore_session(self):
+        path=records.data_path("session.gz")
+        if os.path.exists(path):
+            try:
+                self.history,self.listing=snapshot.load(path,self.reddit)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                print("Can't restore your last session:",e)
+                return
+            if self.listing:
+                self.prompt=self.listing.prompt
+                print("Your last session was restored. Press Enter to show it.")
+    
+    def postcmd(self,stop,line):
+        #save the session every minute, in case resh doesn't exit cleanly
+        if not stop and time.time()-self.snapshot_time>60:
+            self.save_session()
+        if self.outbox:
+            for notice in self.outbox.take_notices():
+                print(notice)
+        if stop:
+            self.flush_outbox()
+        return stop
+    
+    def flush_outbox(self):
+        """Gives the outbox some time to send what's left in it before exiting.
+        It must be called outside of a command, since sending needs the network lock"""
+        if self.outbox and self.outbox.sendable(self.outbox.pending()):
+            print("Sending the items in the outbox...")
+            self.outbox.drain(30)
+            for notice in self.outbox.take_notices():
+                print(notice)
+        if self.outbox and self.outbox.pending():
+            if self.tracer and self.tracer.replaying:
+                print(len(self.outbox.pending()),"items of the replay weren't sent")
+            else:
+                print(len(self.outbox.pending()),"items are still in the outbox. They'll be sent the next time you log in")
 
     def emptyline(self):
-        self.clear()
-        print(self.listing)
+        self.show()
     
     def do_search(self,line):
-        """usage: search [pattern]
+        """usage: search [--local] [pattern]
     Search posts with a pattern. If used inside a subreddit, the results
     are restricted to the current subreddit. Otherwise, the search 
-    returns result from the whole site"""
+    returns result from the whole site
+    
+    --local
+        Searches the titles, self text and comments of everything
+        resh has shown before, without asking reddit"""
         #TODO: add syntax to search for subreddit names
         
+        local=line.startswith('--local')
+        if local:
+            line=line[len('--local'):].strip()
         if not line:
             line=input("Search for: ")
-        if isinstance(self.listing,Subreddit_Listing):
-            #We're in a subreddit, so search inside it
-            results=self.listing.subreddit.search(line,limit=None)
+        if local:
+            if not self.index:
+                print("The local index isn't available")
+                return
+            results=list(self.index.search(line))
             if results:
-                self.load_Listing(Subreddit_Search_Listing(line,self.listing.subreddit,results))
+                self.load_Listing(Local_Search_Listing(line,iter(results)))
+            else:
+                print("No items in the local index match your search ",line)
+        elif isinstance(self.listing,Subreddit_Listing):
+            #We're in a subreddit, so search inside it
+            sub=records.rehydrate(self.reddit,self.listing.reddit_object)
+            results=self.searches.search(line,sub)
+            if not results.empty():
+                self.load_Listing(Subreddit_Search_Listing(line,sub,iter(results)))
             else:
                 print("No posts match your search ",line)
         else:
             #search across the entire site
-            results=self.reddit.search(line,limit=None)
-            if results:
-                self.load_Listing(Search_Listing(line,results))
+            results=self.searches.search(line)
+            if not results.empty():
+                self.load_Listing(Search_Listing(line,iter(results)))
             else:
                 print("No posts match your search ",line)            
             
     
+    def do_sort(self,line):
+        """usage: sort [best|top|new|controversial|old]
+    Sorts the comments of the current submission. Each order is fetched
+    at most once every five minutes, and when every comment is already
+    known, they're sorted without asking reddit. Without an argument,
+    it shows the current order"""
+        if not isinstance(self.listing,Submission_Listing):
+            print("Only the comments of a submission can be sorted. Type 'go <number>' to enter one")
+        elif not line:
+            print("Comments are sorted by",self.listing.sort or "reddit's default order")
+        elif line not in sorts.SORTS:
+            print("Invalid argument. For help, type 'help sort'")
+        else:
+            submission=self.listing.reddit_object
+            if not vars(submission).get('_offline'):
+                submission=records.rehydrate(self.reddit,submission)
+            self.listing.sort_by(line,self.comment_sorts.comments(submission,line))
+            self.show()
+    
+    def do_seen(self,line):
+        """usage: seen [hide|dim]
+    Changes how items that were already shown or opened are displayed
+    in new listings. Without an argument, it shows how many items have
+    been seen.
+    
+    hide
+        Seen items are skipped
+    dim
+        Seen items are shown dimmed"""
+        if self.read_state is None:
+            print("Seen items aren't being tracked")
+        elif line=='hide':
+            Listing.hide_seen=True
+            print("Seen items will be hidden")
+        elif line=='dim':
+            Listing.hide_seen=False
+            print("Seen items will be dimmed")
+        elif not line:
+            print(len(self.read_state),"items have been seen")
+        else:
+            print("Invalid argument. For help, type 'help seen'")
+    
+    def do_filter(self,line):
+        """usage: filter term [term ...]
+    Shows only the items in the current listing that pass every term.
+    Each term is a field, an operator and a value, with no spaces:
+    
+    fields
+        score, comments, age, domain, author, subreddit, title
+    operators
+        = != > < >= <=   compare numbers or text
+        ~ !~             match or don't match a regular expression
+    values
+        ages can be written like 30m, 12h, 2d or 1w
+        
+    At most 1000 items are scanned, add scan=<number> to change that.
+    e.g.: filter score>500 domain!~imgur age<1d"""
+        if not self.listing:
+            print("There are no items to filter. Type 'frontpage' to see its items.")
+            return
+        if not line:
+            line=input("Filter by: ")
+        try:
+            self.load_Listing(Filtered_Listing(self.listing,filters.Filter(line)))
+        except ValueError as e:
+            print(e,". For help, type 'help filter'",sep='')
+    
     def do_subreddit(self,line):
         """usage: subreddit [subreddit]
     Goes to a subreddit. If subreddit is omitted, the command 
     lists the user's suscribed subreddits."""
         if line:
             try:
-                self.load_Listing(Subreddit_Listing(self.reddit.get_subreddit(line)))
+                self.load_Listing(Subreddit_Listing(self.metadata.subreddit(line)))
             except:
                 print("The subreddit "+line+" does not exist")
         else:
@@ -198,7 +464,8 @@ class resh(cmd.Cmd):
         """usage: frontpage
     Lists the posts on the user's frontpage if he or she is logged in, 
     and the default front page otherwise"""
-        self.load_Listing(Frontpage_Listing(self.reddit.get_front_page(limit=None)))
+        source=lambda url_data: self.reddit.get_front_page(limit=None,url_data=url_data)
+        self.load_Listing(Frontpage_Listing(source({}),source))
     
     def do_login(self,line):
         """usage: login [user]
@@ -226,7 +493,7 @@ class resh(cmd.Cmd):
         if not line:
             line=input("Display overview for user ")
         #try:
-        self.load_Listing(User_Listing(self.reddit.get_redditor(line)))
+        self.load_Listing(User_Listing(self.metadata.redditor(line)))
         #except:
             #print("The user "+line+" does not exist")
 
@@ -237,10 +504,21 @@ class resh(cmd.Cmd):
         try:
             if(self.listing):
                 goto=self.listing.go(int(line))
+                if vars(goto).get('_offline'):
+                    #archived threads are read offline
+                    if isinstance(goto,records.STUBS['Submission']):
+                        self.load_Listing(Submission_Listing(self.archive.get(goto.content_id)))
+                    else:
+                        self.load_Listing(Comment_Listing(goto))
+                    return
+                goto=records.rehydrate(self.reddit,goto)
+                self.mark_seen([goto])
 
                 if isinstance(goto,reddit.objects.Subreddit):
                     self.load_Listing(Subreddit_Listing(goto))
                 elif isinstance(goto,reddit.objects.Submission):
+                    if self.prefetcher:
+                        self.prefetcher.entered(int(line))
                     self.load_Listing(Submission_Listing(goto))
                 elif isinstance(goto,reddit.objects.Comment):
                     self.load_Listing(Comment_Listing(goto))
@@ -257,10 +535,8 @@ class resh(cmd.Cmd):
     Opens an item in a browser. If number is omitted,
     the current listing is opened"""
         try:
-            if not line:
-                obj=self.listing.reddit_object
-            else:
-                obj=self.listing.go(int(line))
+            obj=self.get_item(line)
+            self.mark_seen([obj])
                 
             if isinstance(obj,reddit.objects.Subreddit):
                 url="http://reddit.com"+obj.url
@@ -287,10 +563,8 @@ class resh(cmd.Cmd):
     the current listing is viewed. Not every type of file can
     be viewed. Works best for articles on the Web."""
         try:
-            if not line:
-                obj=self.listing.reddit_object
-            else:
-                obj=self.listing.go(int(line))
+            obj=self.get_item(line)
+            self.mark_seen([obj])
                 
             #Is it a imgur page? Fetch just the image
             m = re.match(r"http://imgur\.com/(?P<num>[a-zA-Z0-9]*)", obj.url)
@@ -352,14 +626,19 @@ class resh(cmd.Cmd):
     def do_reply(self,line):
         """usage: reply [number]
     Replies to a message, post or comment. If number is omitted,
-    the reply is posted to the current listing."""      
+    the reply is posted to the current listing. The reply is sent
+    in the background, type 'outbox' to check on it"""      
+        if not self.redditor:
+            raise reddit.errors.LoginRequired("")
+        if not self.outbox:
+            print("The outbox isn't available")
+            return
         try:
-            if not line:
-                f=self.listing.reddit_object.reply
-            else:
-                f=self.listing.go(int(line)).reply
+            target=self.get_item(line)
+            target.reply #only things that can be replied to have it
             
-            f(self.multiline_input("Write your reply below. When it's finished,\nleave a line blank and press Enter."))
+            self.outbox.reply(target,self.multiline_input("Write your reply below. When it's finished,\nleave a line blank and press Enter."))
+            print("Your reply will be sent in the background")
         except (ValueError,IndexError):
             print("Invalid argument. For help, type 'help reply'")
         except AttributeError:
@@ -368,19 +647,20 @@ class resh(cmd.Cmd):
     def do_message(self,line):
         """usage: message [recipient]
     Send a private message to a user or a subreddit. If the recipient
-    is a subreddit, prefix the name with '/r/'"""
+    is a subreddit, prefix the name with '/r/'. The message is sent
+    in the background, type 'outbox' to check on it"""
         if self.redditor:
-            try:
-                if not line:
-                    recipient=input("Send a message to: ")
-                else:
-                    recipient=line
-                subject=input("Subject: ")
-                message=self.multiline_input("Write your message below. When it's finished,\nleave a line blank and press Enter.")         
-                self.reddit.compose_message(recipient, subject, message)
-                print("Message sent.")
-            except:
-                print("There was a problem sending the message")
+            if not self.outbox:
+                print("The outbox isn't available")
+                return
+            if not line:
+                recipient=input("Send a message to: ")
+            else:
+                recipient=line
+            subject=input("Subject: ")
+            message=self.multiline_input("Write your message below. When it's finished,\nleave a line blank and press Enter.")         
+            self.outbox.message(recipient, subject, message)
+            print("Your message will be sent in the background")
         else:
             raise reddit.errors.LoginRequired("")
         
@@ -389,6 +669,135 @@ class resh(cmd.Cmd):
     Displays the logged-in user's saved links"""
         self.load_Listing(Saved_Listing(self.reddit.get_saved_links(limit=None)))
             
+    def do_archive(self,line):
+        """usage: archive [number|page]
+    Saves a submission and all of its comments in the offline archive.
+    If number is omitted, the current submission is archived. With 'page',
+    every submission in the current page is archived. To read archived
+    threads, type 'archived'"""
+        if self.archive is None:
+            print("The archive isn't available")
+            return
+        try:
+            if line=='page':
+                submissions=[i for i in self.listing.items if isinstance(i,(reddit.objects.Submission,records.Stub))]
+            else:
+                submissions=[self.get_item(line)]
+            count=0
+            for submission in submissions:
+                submission=records.rehydrate(self.reddit,submission)
+                if isinstance(submission,reddit.objects.Submission):
+                    self.archive.add(submission)
+                    count+=1
+            if count:
+                print("Archived",count,"thread" if count==1 else "threads")
+            else:
+                print("Can't archive this")
+        except (ValueError, IndexError):
+            print("Invalid argument. For help, type 'help archive'")
+        except AttributeError:
+            print("Can't archive this")
+    
+    def do_archived(self,line):
+        """usage: archived
+    Lists the threads in the offline archive, newest first. They can be
+    read without a connection to reddit"""
+        if self.archive:
+            self.load_Listing(Archive_Listing(self.archive.submissions()))
+        else:
+            print("There are no archived threads. To archive one, type 'archive'")
+    
+    def do_export(self,line):
+        """usage: export file [max]
+    Writes every item in the current listing to a file, as JSON lines
+    or as CSV if the file name ends with '.csv'. If max is given, at
+    most that many items are written. An interrupted export is resumed
+    by running the same command again."""
+        args=line.split()
+        try:
+            if not self.listing or not 1<=len(args)<=2:
+                raise ValueError
+            max_items=int(args[1]) if len(args)==2 else None
+        except ValueError:
+            print("Invalid argument. For help, type 'help export'")
+            return
+        try:
+            count=export.export(self.listing,args[0],max_items,sys.stderr if self.batch else sys.stdout)
+            print("Exported",count,"items to",args[0])
+        except KeyboardInterrupt:
+            print("\nExport interrupted. To resume it, type 'export",line+"'")
+        except Cursor_Lost:
+            print("\nThe last item exported isn't in the listing anymore, so the export can't be resumed.",
+                  "To start over, delete",export.checkpoint_path(args[0]))
+        except export.Other_Listing:
+            print("There's an interrupted export of another listing to",args[0]+". To keep it, export this one to another file.",
+                  "To start over, delete",export.checkpoint_path(args[0]))
+        except OSError as e:
+            print("Can't write to",args[0],":",e)
+            
+    def do_analyze(self,line):
+        """usage: analyze [number]
+    Prints statistics about the first items in the current listing:
+    scores, posts per hour, top domains and authors and comments per
+    point. At most 1000 items are analyzed, unless number says otherwise.
+    Needs NumPy"""
+        try:
+            if not self.listing:
+                print("There are no items to analyze. Type 'frontpage' to see its items.")
+                return
+            n=int(line) if line else 1000
+            if n<1:
+                raise ValueError
+        except ValueError:
+            print("Invalid argument. For help, type 'help analyze'")
+            return
+        for out in analyze.analyze(self.listing.restart(),n):
+            print(out)
+
+    def do_outbox(self,line):
+        """usage: outbox [retry|clear]
+    Shows the replies, messages and posts that haven't been sent yet,
+    and the ones that failed, with the reason and their text. Those
+    that got no answer from reddit may have been sent anyway.
+    
+    retry
+        Tries to send the failed items again
+    clear
+        Discards the failed items"""
+        if not self.outbox:
+            print("The outbox isn't available")
+        elif line=='retry':
+            self.outbox.retry()
+            print("The failed items will be sent again")
+        elif line=='clear':
+            self.outbox.discard_failed()
+            print("Discarded the failed items")
+        elif not line:
+            pending,failed=self.outbox.pending(),self.outbox.failed()
+            if not pending and not failed:
+                print("The outbox is empty")
+            for item in pending:
+                if item['error']:
+                    wait=max(item['next_try']-time.time(),0)
+                    print("Waiting  {} (retrying in {:.0f} s: {})".format(item['description'],wait,item['error']))
+                else:
+                    print("Sending ",item['description'])
+            for item in failed:
+                print(Listing.ORANGERED+"Failed  "+Listing.RESET,item['description'])
+                print("        ",item['error'])
+                text=item['args'].get('text') or item['args'].get('url') or ''
+                print("\n".join("         "+l for l in text.split("\n")))
+            if failed:
+                print("To send them again, type 'outbox retry'. To discard them, type 'outbox clear'")
+        else:
+            print("Invalid argument. For help, type 'help outbox'")
+
+    def do_connections(self,line):
+        """usage: connections
+    Shows how many requests were made to reddit, and how much time
+    was saved by keeping connections open between them"""
+        print(self.keep_alive.stats())
+            
     def do_py(self,line):
         """usage: py expression
     Evaluates a python expression and prints its value. It's useful
@@ -431,7 +840,13 @@ class resh(cmd.Cmd):
         #TODO: What's the deal with captchas?
         """usage: submit [link]
     Submit a link. You will be prompted for your post's title,
-    the subreddit, and if link is ommited, for a URL or self text"""
+    the subreddit, and if link is ommited, for a URL or self text.
+    The post is sent in the background, type 'outbox' to check on it"""
+        if not self.redditor:
+            raise reddit.errors.LoginRequired("")
+        if not self.outbox:
+            print("The outbox isn't available")
+            return
         title=input("Title: ")
         default_sub=self.find_subreddit()
         if default_sub:
@@ -439,33 +854,47 @@ class resh(cmd.Cmd):
         else:
             q="Post to subreddit:\n/r/"
         sub=input(q)
-        if not sub: sub= default_sub.display_name
+        if not sub:
+            if not default_sub:
+                print("A subreddit is needed to post")
+                return
+            sub= default_sub.display_name
         
-        url=input("Link:   (type 'self' to make a self post)")
+        if not line:
+            line=input("Link:   (type 'self' to make a self post)")
         
-        try:
-            if url=='self':
-                self.reddit.submit(sub, 
-                                   title, 
-                                   text=self.multiline_input("Enter your self text.\n When you're done, leave a blank line and press Enter")
-                                   )
-            else:
-                self.reddit.submit(sub, 
-                                   title,
-                                   url=url
-                                   )
-        except reddit.errors.BadCaptcha:
-            print("A captcha is required. Captchas are not yet supported by resh")
+        if line=='self':
+            self.outbox.submit(sub, 
+                               title, 
+                               text=self.multiline_input("Enter your self text.\n When you're done, leave a blank line and press Enter")
+                               )
+        else:
+            self.outbox.submit(sub, 
+                               title,
+                               url=line
+                               )
+        print("Your post will be sent in the background")
 
     def onecmd(self,command):
+        if self.tracer:
+            self.tracer.begin()
+            start=time.perf_counter()
+            try:
+                return self._onecmd(command)
+            finally:
+                self.tracer.command(command,time.perf_counter()-start)
+        return self._onecmd(command)
+
+    def _onecmd(self,command):
         try:
-             # +/- shorthand commands for voting
-            if command=='+':
-                return super().onecmd('upvote')
-            elif command=='-':
-                return super().onecmd('downvote')
-            else:
-                return super().onecmd(command)
+            with self.network_lock:
+                 # +/- shorthand commands for voting
+                if command=='+':
+                    return super().onecmd('upvote')
+                elif command=='-':
+                    return super().onecmd('downvote')
+                else:
+                    return super().onecmd(command)
         except URLError:
             print("Can't reach reddit. There may be a problem with your connection or reddit may be down")
         except reddit.errors.LoginRequired:
@@ -473,14 +902,29 @@ class resh(cmd.Cmd):
         except reddit.errors.ModeratorRequired:
             print("You must be a moderator to do this")
             
+    def complete_subreddit(self,text,line,begidx,endidx):
+        return self.names.complete_subreddit(text)
+    
+    def complete_subscribe(self,text,line,begidx,endidx):
+        return self.names.complete_subreddit(text)
+    
+    def complete_unsubscribe(self,text,line,begidx,endidx):
+        return self.names.complete_subreddit(text)
+    
+    def complete_user(self,text,line,begidx,endidx):
+        return self.names.complete_user(text)
+    
+    def complete_message(self,text,line,begidx,endidx):
+        #'/' is a word delimiter for readline, so '/r/name' is completed as 'name'
+        if line[:begidx].endswith('/r/'):
+            return self.names.complete_subreddit(text)
+        return self.names.complete_user(text)
+            
     # BEGIN BORING COMMANDS
     def call_action(self,action,line,success_msg,error_msg):
         """Calls a function of the current item or a numbered item"""
         try:
-            if not line:
-                getattr(self.listing.reddit_object,action)()
-            else:
-                getattr(self.listing.go(int(line)), action)()
+            getattr(self.get_item(line),action)()
             print(success_msg)
         except (ValueError, IndexError):
             print("Invalid argument. For help, type 'help ",action,"'",sep='')
@@ -544,7 +988,37 @@ class resh(cmd.Cmd):
         
 
 if __name__ == "__main__":
-    resh().cmdloop("""
+    parser=argparse.ArgumentParser(description="resh, the reddit command-line shell")
+    parser.add_argument('-c',metavar='commands',dest='commands',
+                        help="run the ';'-separated commands and print items as JSON lines")
+    parser.add_argument('--record',metavar='file',
+                        help="save the session's requests, responses and commands, with their timings, to file")
+    parser.add_argument('--replay',metavar='file',
+                        help="run a recorded session again against its recorded responses and compare timings")
+    args=parser.parse_args()
+    batch=args.commands is not None or not sys.stdin.isatty()
+    
+    tracer=None
+    if args.replay:
+        tracer=traffic.Player(args.replay)
+        try:
+            shell=resh(batch=tracer.batch,tracer=tracer)
+            tracer.run(shell)
+            shell.flush_outbox()
+        finally:
+            tracer.close()
+        sys.exit()
+    elif args.record:
+        tracer=traffic.Recorder(args.record,batch)
+        print("Recording to",args.record+". Seen items, the local index and the session won't be kept,",
+              "only the archive and the outbox",file=sys.stderr)
+    try:
+        if args.commands is not None:
+            resh(batch=True,tracer=tracer).run_batch([args.commands])
+        elif batch:
+            resh(batch=True,tracer=tracer).run_batch(sys.stdin)
+        else:
+            resh(tracer=tracer).cmdloop("""
                    ##### ######.     
                   ##   ?##    ##     
                  ##      #$   ##     
@@ -565,4 +1039,7 @@ if __name__ == "__main__":
 Type 'frontpage' or 'subreddit <name>' to show posts
 For a list of commands, type 'help'
 To exit, type 'exit' (duh!) or press {}
-""".format("CTRL-Z then Enter" if sys.platform=='win32' else "CTRL-D"  ))
\ No newline at end of file
+""".format("CTRL-Z then Enter" if sys.platform=='win32' else "CTRL-D"  ))
+    finally:
+        if tracer:
+            tracer.close()
\ No newline at end of file
@@ -0,0 +1,84 @@
+#===============================================================================
+# This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#===============================================================================
+
+"""
+    Cache of reddit search results for resh, the reddit command-line shell
+    @author: Luis E. Perez (edd07 at github)
+"""
+
+import time
+from collections import OrderedDict
+
+#boolean operators, which reddit only reads as such when they're uppercase
+OPERATORS=('AND','OR','NOT')
+
+def normalize(query):
+    """Returns the cache key of a query: lowercased, except for its boolean
+    operators, and with its whitespace collapsed. Search terms are case
+    insensitive, so queries that only differ in those share results"""
+    return " ".join(w if w in OPERATORS else w.lower() for w in query.split())
+
+class Cached_Results():
+    """Results of a search, fetched as they're needed and kept, so every
+    iterator over them replays what was already fetched before asking
+    reddit for more"""
+    def __init__(self,generator):
+        self.generator=generator
+        self.items=[]
+        self.exhausted=False
+
+    def __iter__(self):
+        i=0
+        while True:
+            if i<len(self.items):
+                yield self.items[i]
+                i+=1
+            elif self.exhausted:
+                return
+            else:
+                try:
+                    self.items.append(next(self.generator))
+                except StopIteration:
+                    self.exhausted=True
+
+    def empty(self):
+        """Tells if there are no results. It only takes the first batch
+        of results, which is needed to show them anyway"""
+        return next(iter(self),None) is None
+
+class Search_Cache():
+    """Keeps the results of the last searches for ttl seconds, by
+    normalized query and subreddit"""
+    def __init__(self,session,ttl=600,size=50):
+        self.session=session
+        self.ttl=ttl
+        self.size=size
+        self.cache=OrderedDict() #(query, subreddit) -> (expiry time, Cached_Results)
+
+    def search(self,query,subreddit=None):
+        """Returns the Cached_Results for query, in subreddit if it's given.
+        reddit gets the query as it was written"""
+        key=(normalize(query),subreddit.display_name.lower() if subreddit else None)
+        entry=self.cache.pop(key,None)
+        if not entry or entry[0]<time.time():
+            if subreddit:
+                generator=subreddit.search(query,limit=None)
+            else:
+                generator=self.session.search(query,limit=None)
+            entry=(time.time()+self.ttl,Cached_Results(generator))
+        self.cache[key]=entry #most recently used last
+        while len(self.cache)>self.size:
+            self.cache.popitem(last=False)
+        return entry[1]
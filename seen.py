@@ -0,0 +1,161 @@
+#===============================================================================
+# This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#===============================================================================
+
+"""
+    On-disk set of the items already seen in resh, the reddit shell
+    @author: Luis E. Perez (edd07 at github)
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+
+import records
+
+MAGIC=b"reshseen"
+HEADER=struct.Struct("<8sQQ") #magic, capacity, count
+INITIAL_CAPACITY=1<<16
+MASK=(1<<64)-1
+MIX=0x9E3779B97F4A7C15 #spreads consecutive keys across the table
+
+def key(fullname):
+    """Converts a fullname to a nonzero 64-bit key. Fullnames like 't3_1abcde'
+    are a kind number and a base 36 id, so they are packed without collisions"""
+    kind,sep,id=fullname.partition('_')
+    try:
+        if len(kind)==2 and kind[0]=='t' and len(id)<=11:
+            return (int(id,36)<<4 | int(kind[1]))+1
+    except ValueError:
+        pass
+    return int.from_bytes(hashlib.blake2b(fullname.encode('utf-8'),digest_size=8).digest(),'little') | 1
+
+class Mmap_Table():
+    """A hash table of 64-bit keys with open addressing, kept in a memory-mapped
+    file. Each slot is a key followed by width-1 64-bit values, and the
+    table doubles when two thirds full, so it's between a third and two
+    thirds full"""
+    def __init__(self,path,magic,width=1):
+        self.path=path
+        self.magic=magic
+        self.width=width
+        if not os.path.exists(self.path):
+            self._create(self.path,INITIAL_CAPACITY)
+        self._map()
+
+    def _create(self,path,capacity):
+        with open(path,'wb') as f:
+            f.write(HEADER.pack(self.magic,capacity,0))
+            f.truncate(HEADER.size+8*self.width*capacity)
+
+    def _map(self):
+        self.file=open(self.path,'r+b')
+        self.mm=mmap.mmap(self.file.fileno(),0)
+        magic,self.capacity,self.count=HEADER.unpack_from(self.mm)
+        if magic!=self.magic:
+            raise ValueError(self.path+" is not a resh "+self.magic[4:].decode()+" file")
+        self.slots=memoryview(self.mm)[HEADER.size:].cast('Q')
+        self.mask=self.capacity-1
+
+    def _find(self,k):
+        """Returns the position of the slot holding k, or of the empty slot where it would go"""
+        slots,width=self.slots,self.width
+        i=((k*MIX)&MASK)>>32 & self.mask
+        while slots[i*width] and slots[i*width]!=k:
+            i=(i+1)&self.mask
+        return i*width
+
+    def __contains__(self,fullname):
+        return self.slots[self._find(key(fullname))]!=0
+
+    def get(self,fullname):
+        """Returns the values stored for fullname, or None"""
+        i=self._find(key(fullname))
+        if self.slots[i]:
+            return tuple(self.slots[i+1:i+self.width])
+        return None
+
+    def put(self,fullname,*values):
+        self._put(key(fullname),values)
+
+    def _put(self,k,values):
+        if self._store(k,values):
+            self.count+=1
+            HEADER.pack_into(self.mm,0,self.magic,self.capacity,self.count)
+            if self.count*3>self.capacity*2:
+                self._grow()
+
+    def _store(self,k,values):
+        """Writes k and its values to their slot. Returns whether k is new"""
+        i=self._find(k)
+        new=not self.slots[i]
+        self.slots[i]=k
+        for j,value in enumerate(values,i+1):
+            self.slots[j]=value
+        return new
+
+    def items(self):
+        """Yields the (key, values) of every slot in use"""
+        slots,width=self.slots,self.width
+        for i in range(0,len(slots),width):
+            if slots[i]:
+                yield slots[i],tuple(slots[i+1:i+width])
+
+    def _grow(self):
+        """Copies every slot into a table twice as big, then swaps the files.
+        The new file is complete before it replaces the old one, so a crash
+        doesn't lose the table"""
+        tmp=self.path+".tmp"
+        self._create(tmp,self.capacity*2)
+        bigger=Mmap_Table.__new__(type(self))
+        bigger.path,bigger.magic,bigger.width=tmp,self.magic,self.width
+        bigger._map()
+        for k,values in self.items():
+            bigger._store(k,values)
+        bigger.count=self.count
+        HEADER.pack_into(bigger.mm,0,bigger.magic,bigger.capacity,bigger.count)
+        bigger.close()
+        self.close()
+        os.replace(tmp,self.path)
+        self._map()
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self.mm.flush()
+        self.slots.release()
+        self.mm.close()
+        self.file.close()
+
+class Seen_Store(Mmap_Table):
+    """Set of the fullnames of seen items. Each one takes 12 to 24 bytes
+    depending on how full the table is, e.g. 16 to 32 MB for a million"""
+    def __init__(self,path=None):
+        super().__init__(path or records.data_path("seen.db"),MAGIC)
+
+    def _find(self,k):
+        #the same as Mmap_Table._find, without the slot width, since lookups
+        #happen for every item that's shown
+        slots=self.slots
+        i=((k*MIX)&MASK)>>32 & self.mask
+        while slots[i] and slots[i]!=k:
+            i=(i+1)&self.mask
+        return i
+
+    def add(self,fullname):
+        k=key(fullname)
+        if not self.slots[self._find(k)]:
+            self._put(k,())
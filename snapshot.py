@@ -0,0 +1,153 @@
+#===============================================================================
+# This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#===============================================================================
+
+"""
+    Saving and restoring browsing sessions of resh, the reddit shell
+    @author: Luis E. Perez (edd07 at github)
+"""
+
+import gzip
+import json
+import os
+from itertools import chain
+
+import reddit
+import records
+import listings
+import sorts
+
+#Listings that can be rebuilt from their attributes. Others are restored as
+#plain Listings, since they need live objects to be displayed
+RESTORABLE=('My_Subreddits_Listing','Saved_Listing','Search_Listing','Subreddit_Search_Listing',
+            'Local_Search_Listing','Subreddit_Listing','Frontpage_Listing','User_Listing',
+            'Inbox_Listing','Submission_Listing')
+
+def resume(session,origin,after=None):
+    """Returns a generator over the listing described by origin, starting after
+    the item with the fullname 'after'"""
+    kind,args=origin[0],origin[1:]
+    url_data={'after': after} if after else {}
+    if kind=='subreddit':
+        name,sort=args
+        return getattr(session.get_subreddit(name),'get_'+sort)(limit=None,url_data=url_data)
+    elif kind=='frontpage':
+        return session.get_front_page(limit=None,url_data=url_data)
+    elif kind=='user':
+        return session.get_redditor(args[0]).get_overview(limit=None,url_data=url_data)
+
+    #the rest can't start at a cursor, so they skip up to it
+    if kind=='search':
+        terms,sub=args
+        items=session.get_subreddit(sub).search(terms,limit=None) if sub else session.search(terms,limit=None)
+    elif kind=='saved':
+        items=session.get_saved_links(limit=None)
+    elif kind in ('inbox','my_subreddits'):
+        if not session.user:
+            raise reddit.errors.LoginRequired("")
+        if kind=='inbox':
+            items=getattr(session.user,'get_'+args[0])(limit=None)
+        else:
+            items=session.user.my_reddits(limit=None)
+    elif kind=='submission':
+        submission=session.get_submission(url=args[0])
+        if len(args)>1 and args[1]:
+            items=iter(sorts.Comment_Store(session).comments(submission,args[1]))
+        else:
+            items=iter(submission.comments)
+    else:
+        items=iter(())
+    return listings.skip_past(items,after) if after else items
+
+def lazy(factory):
+    """A generator that only calls factory when its first item is needed"""
+    yield from factory()
+
+def page_records(page):
+    return [records.to_record(item) for item in page]
+
+def page_stubs(page):
+    return [records.from_record(record) for record in page]
+
+def save_listing(listing):
+    pages=listing.prev+[listing.items or []]+listing.next[::-1]
+    fetched=[item for page in pages for item in page]
+    reddit_object=getattr(listing,'reddit_object',None)
+    return {
+            'class': listing.__class__.__name__,
+            'title': listing.title,
+            'prompt': listing.prompt,
+            'content': listing.content,
+            'origin': listing.origin,
+            'after': records.fullname(fetched[-1]) if fetched else None,
+            'prev': [page_records(page) for page in listing.prev],
+            'items': page_records(listing.items or []),
+            'next': [page_records(page) for page in listing.next],
+            'seen_before': sorted(listing.seen_before),
+            'reposts': listing.reposts,
+            'reddit_object': records.to_record(reddit_object) if reddit_object is not None else None,
+            }
+
+def load_listing(session,state):
+    """Rebuilds a listing from its saved state, without any requests. Items
+    are stubs, and new pages are only fetched when they're needed"""
+    name=state['class'] if state['class'] in RESTORABLE else 'Listing'
+    cls=getattr(listings,name)
+    listing=cls.__new__(cls)
+    listing._setup_formatting()
+    listing.title=state['title']
+    listing.prompt=state['prompt']
+    listing.content=state['content']
+    listing.prev=[page_stubs(page) for page in state['prev']]
+    listing.items=page_stubs(state['items'])
+    listing.next=[page_stubs(page) for page in state['next']]
+    listing.keep_pages=True
+    listing.seen_before=set(state['seen_before'])
+    listing.reposts=state.get('reposts',{})
+    listing.collapsed={}
+    #the items already fetched collapse the reposts in the pages still to come
+    for item in chain.from_iterable(listing.prev+[listing.items]+listing.next):
+        listing.is_repost(item,item.content_id)
+    if state['reddit_object']:
+        listing.reddit_object=records.from_record(state['reddit_object'])
+    if state['origin']:
+        origin=tuple(state['origin'])
+        listing.origin=origin
+        if origin[0]=='submission' and len(origin)>2:
+            listing.sort=origin[2]
+        listing.source=lambda url_data: resume(session,origin,url_data.get('after'))
+        listing.generator=lazy(lambda: resume(session,origin,state['after']))
+    else:
+        listing.source=None
+        listing.generator=iter(())
+    return listing
+
+def save(path,history,listing):
+    """Writes the history stack and the current listing to path, gzipped"""
+    state={
+           'history': [save_listing(l) if l else None for l in history],
+           'listing': save_listing(listing) if listing else None,
+           }
+    tmp=path+".tmp"
+    with gzip.open(tmp,'wt',encoding='utf-8') as f:
+        json.dump(state,f,separators=(',',':'))
+    os.replace(tmp,path)
+
+def load(path,session):
+    """Returns the (history, listing) saved in path"""
+    with gzip.open(path,'rt',encoding='utf-8') as f:
+        state=json.load(f)
+    history=[load_listing(session,l) if l else None for l in state['history']]
+    listing=load_listing(session,state['listing']) if state['listing'] else None
+    return history,listing
@@ -0,0 +1,142 @@
+#===============================================================================
+# This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#===============================================================================
+
+"""
+    Comments of a submission in every sort order for resh, the reddit shell
+    @author: Luis E. Perez (edd07 at github)
+"""
+
+import math
+import time
+from collections import OrderedDict
+
+import reddit
+import records
+
+def points(comment):
+    return comment.ups-comment.downs
+
+def controversy(comment):
+    """reddit's controversial sort: many votes, evenly split"""
+    ups,downs=comment.ups,comment.downs
+    if ups<=0 or downs<=0:
+        return 0
+    return (ups+downs)**(downs/ups if ups>downs else ups/downs)
+
+def confidence(comment):
+    """reddit's best sort: the lower bound of the Wilson score interval of the
+    fraction of upvotes"""
+    n=comment.ups+comment.downs
+    if n<=0:
+        return 0
+    z=1.281551565545 #80% confidence
+    p=comment.ups/n
+    return (p+z*z/(2*n)-z*math.sqrt((p*(1-p)+z*z/(4*n))/n))/(1+z*z/n)
+
+#name of each sort in reddit's API, and how to sort comments that way locally
+SORTS=OrderedDict([
+                   ('best',          ('confidence',    lambda c: -confidence(c))),
+                   ('top',           ('top',           lambda c: -points(c))),
+                   ('new',           ('new',           lambda c: -c.created_utc)),
+                   ('controversial', ('controversial', lambda c: -controversy(c))),
+                   ('old',           ('old',           lambda c: c.created_utc)),
+                   ])
+
+def fetch(session,submission,sort):
+    """Asks reddit for the comments of a submission in a sort order"""
+    response=session.request_json(submission.permalink,url_data={'sort': SORTS[sort][0]})
+    return response[1]['data']['children']
+
+def complete(comments):
+    """Tells if a list of top-level comments has all of them, in which case
+    it can be sorted in any order without asking reddit"""
+    return not any(isinstance(c,reddit.objects.MoreComments) for c in comments)
+
+class Comment_Store():
+    """Top-level comments of the submissions visited lately in each sort order.
+    A sort is fetched at most once every ttl seconds. When a submission's
+    comments are all known in one order, the other orders are sorted locally.
+
+    Comments fetched again for another sort are replaced by the ones already
+    held, with their votes and text updated, so a comment is the same object
+    in every sort and replies that were loaded aren't fetched again. Only
+    the top-level comments are re-sorted, replies keep their order"""
+    def __init__(self,session,ttl=300,size=20):
+        self.session=session
+        self.ttl=ttl
+        self.size=size
+        self.submissions=OrderedDict() #fullname -> {sort: (expiry time, comments)}, oldest first
+        self.nodes={} #fullname of a submission -> {fullname of a comment: comment}
+
+    def _held(self,submission):
+        """Returns the sorts held for a submission, starting with the comments
+        it was loaded with, which come in reddit's default order. Those of
+        archived threads read offline never expire, so they're only sorted
+        locally"""
+        name=records.fullname(submission)
+        sorts=self.submissions.pop(name,None)
+        if sorts is None:
+            expiry=math.inf if vars(submission).get('_offline') else time.time()+self.ttl
+            sorts={None: (expiry,list(submission.comments))}
+            self.nodes[name]={}
+            self._merge(submission,sorts[None][1])
+        self.submissions[name]=sorts #most recently used last
+        while len(self.submissions)>self.size:
+            old,_=self.submissions.popitem(last=False)
+            self.nodes.pop(old,None)
+        return sorts
+
+    def comments(self,submission,sort):
+        """Returns the top-level comments of a submission in a sort order"""
+        sorts=self._held(submission)
+        now=time.time()
+        expiry,comments=sorts.get(sort,(0,None))
+        if expiry>now:
+            return comments
+        for other_expiry,other in sorts.values():
+            if other_expiry>now and complete(other):
+                comments=sorted(other,key=SORTS[sort][1])
+                break
+        else:
+            comments=self._merge(submission,fetch(self.session,submission,sort))
+        sorts[sort]=(now+self.ttl,comments)
+        return comments
+
+    def _merge(self,submission,comments):
+        """Replaces the comments that are already held by the held ones"""
+        nodes=self.nodes[records.fullname(submission)]
+        out=[]
+        for comment in comments:
+            name=records.fullname(comment)
+            held=nodes.get(name)
+            if held is None:
+                if isinstance(comment,reddit.objects.MoreComments):
+                    out.append(comment)
+                    continue
+                if hasattr(comment,'_update_submission'):
+                    comment._update_submission(submission)
+                #only replies that are loaded, so none are fetched here
+                attributes=vars(comment)
+                replies=attributes.get('_replies',attributes.get('replies'))
+                if replies:
+                    replies[:]=self._merge(submission,replies)
+                nodes[name]=comment
+                out.append(comment)
+            else:
+                for field in ('ups','downs','body','edited'):
+                    if field in vars(comment):
+                        setattr(held,field,getattr(comment,field))
+                out.append(held)
+        return out
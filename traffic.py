@@ -0,0 +1,273 @@
+#===============================================================================
+# This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#===============================================================================
+
+"""
+    Recording and replaying of resh sessions, to profile them offline
+    @author: Luis E. Perez (edd07 at github)
+"""
+
+import base64
+import builtins
+import getpass
+import gzip
+import io
+import json
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict, deque
+from email.message import Message
+from urllib.error import URLError
+from urllib.request import BaseHandler, build_opener, install_opener
+from urllib.response import addinfourl
+
+import records
+
+VERSION=1
+#never written to a trace: passwords and session tokens (the modhash is sent as uh)
+FORM_SECRETS=re.compile(r"\b(passwd|password|uh)=[^&]*")
+JSON_SECRETS=re.compile(r'"(modhash|cookie)"(\s*:\s*)"[^"]*"')
+SECRET_HEADERS=('cookie','set-cookie','authorization')
+
+def redact(data):
+    """Returns a request body as text, without passwords or session tokens"""
+    if data is None:
+        return None
+    if not isinstance(data,str):
+        data=data.decode('utf-8','replace')
+    return FORM_SECRETS.sub(r"\1=redacted",data)
+
+def encode_body(body):
+    """Returns a response body for a trace, without session tokens"""
+    try:
+        return {'body': JSON_SECRETS.sub(r'"\1"\2"redacted"',body.decode('utf-8'))}
+    except UnicodeDecodeError:
+        return {'body64': base64.b64encode(body).decode('ascii')}
+
+def decode_body(event):
+    if 'body64' in event:
+        return base64.b64decode(event['body64'])
+    return event['body'].encode('utf-8')
+
+def remove_data_dir(path):
+    """Removes the data directory of a recording or a replay once it's over"""
+    if records.DATA_DIR==path:
+        records.DATA_DIR=None
+    shutil.rmtree(path,ignore_errors=True)
+
+def make_response(req,code,reason,headers,body):
+    """A response like the ones urllib's handlers return"""
+    message=Message()
+    for name,value in headers:
+        message[name]=value
+    response=addinfourl(io.BytesIO(body),message,req.get_full_url(),code)
+    response.msg=reason
+    return response
+
+class Recording_Handler(BaseHandler):
+    """urllib handler that writes every exchange to a Recorder. It reads each
+    response whole, so the time it took includes receiving the body"""
+    def __init__(self,recorder):
+        self.recorder=recorder
+
+    def http_request(self,req):
+        req.trace_start=time.perf_counter()
+        return req
+
+    def http_response(self,req,response):
+        body=response.read()
+        elapsed=time.perf_counter()-getattr(req,'trace_start',time.perf_counter())
+        headers=[(name,value) for name,value in response.info().items()]
+        event={
+               'type': 'http',
+               'method': req.get_method(),
+               'url': req.get_full_url(),
+               'data': redact(req.data),
+               'status': response.code,
+               'reason': getattr(response,'msg',''),
+               'headers': [(n,'redacted' if n.lower() in SECRET_HEADERS else v) for n,v in headers],
+               'time': round(elapsed,4),
+               }
+        event.update(encode_body(body))
+        self.recorder.write(event)
+        return make_response(req,response.code,getattr(response,'msg',''),headers,body)
+
+    https_request=http_request
+    https_response=http_response
+
+class Recorder():
+    """Writes a trace of a session to a gzipped file of JSON lines: every
+    HTTP exchange of the reddit client and view.py with how long it took,
+    every command with how long it ran, and what was typed at prompts.
+    Passwords, cookies and modhashes are left out.
+
+    The session starts from a new, empty data directory, as its replay will,
+    so both make the same requests. Only the outbox and the archive stay in
+    the real one, since what's written to them mustn't be lost with the
+    directory"""
+    replaying=False
+
+    def __init__(self,path,batch=False):
+        self.outbox_path=records.data_path("outbox.json")
+        self.archive_path=records.data_path("archive.dat")
+        self.file=gzip.open(path,'wt',encoding='utf-8')
+        self.lock=threading.Lock()
+        self.start=time.perf_counter()
+        self.handler=Recording_Handler(self)
+        self.data_dir=records.DATA_DIR=tempfile.mkdtemp(prefix="resh-record-")
+        self.running=0 #commands running; the shell's own prompt isn't recorded
+        self.write({'type': 'start','version': VERSION,'batch': batch,'time': time.time()})
+
+    def write(self,event):
+        event['at']=round(time.perf_counter()-self.start,4)
+        with self.lock:
+            self.file.write(json.dumps(event,separators=(',',':'))+"\n")
+            self.file.flush()
+
+    def install(self,opener):
+        """Records the requests made through opener and through urlopen,
+        and the answers to prompts"""
+        opener.add_handler(self.handler)
+        install_opener(build_opener(self.handler))
+        prompt=builtins.input
+        def recorded_input(*args):
+            line=prompt(*args)
+            if self.running:
+                self.write({'type': 'input','line': line})
+            return line
+        builtins.input=recorded_input
+
+    def begin(self):
+        self.running+=1
+
+    def command(self,line,elapsed):
+        self.running-=1
+        self.write({'type': 'command','line': line,'time': round(elapsed,4)})
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+        remove_data_dir(self.data_dir)
+
+class Replaying_Handler(BaseHandler):
+    """urllib handler that answers requests with the recorded responses,
+    after waiting as long as they took. It comes before every other handler,
+    so nothing reaches the network"""
+    handler_order=50
+
+    def __init__(self,player):
+        self.player=player
+
+    def http_open(self,req):
+        event=self.player.response_for(req)
+        if event is None:
+            raise URLError("not in the trace: "+req.get_method()+" "+req.get_full_url())
+        time.sleep(event['time'])
+        return make_response(req,event['status'],event['reason'],event['headers'],decode_body(event))
+
+    https_open=http_open
+
+class Player():
+    """Runs the commands of a trace again, answering every request with its
+    recorded response and every prompt with what was typed. Requests are
+    matched by method, URL and body, in the order they were recorded.
+
+    Like the recording, the replay uses a new, empty data directory, so it
+    doesn't touch the user's saved session"""
+    replaying=True
+    #nothing is really sent or kept, so they're thrown away with the rest
+    outbox_path=None
+    archive_path=None
+
+    def __init__(self,path):
+        self.responses=defaultdict(deque) #(method, url, data) -> recorded responses
+        self.by_url=defaultdict(deque)    #(method, url) -> the same responses
+        self.commands=[]
+        self.inputs=deque()
+        self.lock=threading.Lock()
+        self.batch=False
+        with gzip.open(path,'rt',encoding='utf-8') as f:
+            for line in f:
+                event=json.loads(line)
+                if event['type']=='start':
+                    if event['version']!=VERSION:
+                        raise ValueError("Unknown trace version "+str(event['version']))
+                    self.batch=event['batch']
+                elif event['type']=='http':
+                    self.responses[(event['method'],event['url'],event['data'])].append(event)
+                    self.by_url[(event['method'],event['url'])].append(event)
+                elif event['type']=='command':
+                    self.commands.append(event)
+                elif event['type']=='input':
+                    self.inputs.append(event['line'])
+        self.handler=Replaying_Handler(self)
+        self.data_dir=records.DATA_DIR=tempfile.mkdtemp(prefix="resh-replay-")
+
+    def response_for(self,req):
+        """Returns the next recorded response to a request, or None. When the
+        body doesn't match, e.g. for a timestamp, any response to the URL will do"""
+        with self.lock:
+            exact=self.responses.get((req.get_method(),req.get_full_url(),redact(req.data)))
+            event=exact[0] if exact else None
+            if event is None:
+                same_url=self.by_url.get((req.get_method(),req.get_full_url()))
+                event=same_url[0] if same_url else None
+            if event is None:
+                return None
+            self.responses[(event['method'],event['url'],event['data'])].remove(event)
+            self.by_url[(event['method'],event['url'])].remove(event)
+            return event
+
+    def install(self,opener):
+        opener.add_handler(self.handler)
+        install_opener(build_opener(self.handler))
+        builtins.input=self.recorded_input
+        getpass.getpass=lambda *args,**kwargs: "" #the login response is recorded anyway
+
+    def recorded_input(self,*args):
+        if args:
+            print(args[0],end='')
+        line=self.inputs.popleft() if self.inputs else ""
+        print(line)
+        return line
+
+    def begin(self):
+        pass
+
+    def command(self,line,elapsed):
+        pass
+
+    def run(self,shell):
+        """Runs the recorded commands in shell and prints how long each one
+        took, compared to the recording"""
+        timings=[]
+        for event in self.commands:
+            start=time.perf_counter()
+            stop=shell.onecmd(event['line'])
+            shell.postcmd(stop,event['line'])
+            timings.append((event['line'],event['time'],time.perf_counter()-start))
+            if stop:
+                break
+        out=sys.stderr
+        print("\n{:<50} {:>12} {:>12}".format("Command","Recorded s","Replayed s"),file=out)
+        for line,recorded,replayed in timings:
+            print("{:<50} {:>12.3f} {:>12.3f}".format(line[:50],recorded,replayed),file=out)
+        print("{:<50} {:>12.3f} {:>12.3f}".format("Total",sum(t[1] for t in timings),sum(t[2] for t in timings)),file=out)
+
+    def close(self):
+        remove_data_dir(self.data_dir)